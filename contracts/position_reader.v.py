@@ -0,0 +1,143 @@
+# Bulk readers of the positions of the Lendroid protocol v1
+# The readers live outside the protocol contract, whose code is at the EIP-170 size limit.
+# Each page holds up to POSITION_PAGE_SIZE rows of position data, with the fields in the
+# order returned by `position`, addresses and the position hash included as uint256.
+# Page limits above POSITION_PAGE_SIZE are rejected, so no position is skipped between pages.
+# Rows past the returned positions are left empty.
+
+# Interface for the protocol contract, used for its position getters
+contract Protocol:
+    def last_position_index() -> uint256: constant
+    def position_index(arg0: uint256) -> bytes32: constant
+    def borrow_positions(arg0: address, arg1: uint256) -> bytes32: constant
+    def lend_positions(arg0: address, arg1: uint256) -> bytes32: constant
+    def position_counts(_address: address) -> (uint256, uint256): constant
+    def position(_position_hash: bytes32) -> (uint256, address, address, address, address, address, uint256, uint256, uint256, address, address, uint256, uint256,
+        uint256, uint256, uint256, uint256, uint256, uint256, uint256, uint256, bytes32): constant
+
+# maximum number of positions returned in a single page
+POSITION_PAGE_SIZE: constant(int128) = 20
+# number of fields in a row of position data
+POSITION_FIELDS: constant(int128) = 22
+# indices of the fields filtered on by `expiring_positions_page`
+POSITION_FIELD_EXPIRES_AT: constant(int128) = 8
+POSITION_FIELD_STATUS: constant(int128) = 15
+
+# constants
+POSITION_STATUS_OPEN: constant(uint256) = 1
+
+protocol: public(address)
+
+
+@public
+def __init__(_protocol_address: address):
+    self.protocol = _protocol_address
+
+
+@private
+@constant
+def position_row(_position_hash: bytes32) -> uint256[POSITION_FIELDS]:
+    _index: uint256
+    _kernel_creator: address
+    _lender: address
+    _borrower: address
+    _relayer: address
+    _wrangler: address
+    _created_at: uint256
+    _updated_at: uint256
+    _expires_at: uint256
+    _borrow_currency_address: address
+    _lend_currency_address: address
+    _borrow_currency_value: uint256
+    _borrow_currency_current_value: uint256
+    _lend_currency_filled_value: uint256
+    _lend_currency_owed_value: uint256
+    _status: uint256
+    _nonce: uint256
+    _relayer_fee: uint256
+    _monitoring_fee: uint256
+    _rollover_fee: uint256
+    _closure_fee: uint256
+    _hash: bytes32
+    _index, _kernel_creator, _lender, _borrower, _relayer, _wrangler, _created_at, _updated_at, _expires_at, _borrow_currency_address, _lend_currency_address, _borrow_currency_value, _borrow_currency_current_value, _lend_currency_filled_value, _lend_currency_owed_value, _status, _nonce, _relayer_fee, _monitoring_fee, _rollover_fee, _closure_fee, _hash = Protocol(self.protocol).position(_position_hash)
+    return [_index, convert(_kernel_creator, uint256), convert(_lender, uint256), convert(_borrower, uint256), convert(_relayer, uint256), convert(_wrangler, uint256), _created_at, _updated_at, _expires_at, convert(_borrow_currency_address, uint256), convert(_lend_currency_address, uint256), _borrow_currency_value, _borrow_currency_current_value, _lend_currency_filled_value, _lend_currency_owed_value, _status, _nonce, _relayer_fee, _monitoring_fee, _rollover_fee, _closure_fee, convert(_hash, uint256)]
+
+
+@public
+@constant
+def borrow_positions_page(_borrower: address, _offset: uint256, _limit: uint256) -> uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]:
+    """
+    @dev Read up to `_limit` positions of a borrower, starting from the `_offset`-th one
+    """
+    assert _limit <= convert(POSITION_PAGE_SIZE, uint256)
+    _page: uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]
+    _positions_count: uint256
+    _lend_positions_count: uint256
+    _positions_count, _lend_positions_count = Protocol(self.protocol).position_counts(_borrower)
+    for i in range(POSITION_PAGE_SIZE):
+        _index: uint256 = _offset + convert(i, uint256)
+        if convert(i, uint256) >= _limit or _index >= _positions_count:
+            break
+        # account positions are stored from index 1
+        _page[i] = self.position_row(Protocol(self.protocol).borrow_positions(_borrower, _index + 1))
+    return _page
+
+
+@public
+@constant
+def lend_positions_page(_lender: address, _offset: uint256, _limit: uint256) -> uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]:
+    """
+    @dev Read up to `_limit` positions of a lender, starting from the `_offset`-th one
+    """
+    assert _limit <= convert(POSITION_PAGE_SIZE, uint256)
+    _page: uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]
+    _borrow_positions_count: uint256
+    _positions_count: uint256
+    _borrow_positions_count, _positions_count = Protocol(self.protocol).position_counts(_lender)
+    for i in range(POSITION_PAGE_SIZE):
+        _index: uint256 = _offset + convert(i, uint256)
+        if convert(i, uint256) >= _limit or _index >= _positions_count:
+            break
+        # account positions are stored from index 1
+        _page[i] = self.position_row(Protocol(self.protocol).lend_positions(_lender, _index + 1))
+    return _page
+
+
+@public
+@constant
+def positions_page(_offset: uint256, _limit: uint256) -> uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]:
+    """
+    @dev Read up to `_limit` positions by `position_index`, starting from `_offset`
+    """
+    assert _limit <= convert(POSITION_PAGE_SIZE, uint256)
+    _page: uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]
+    _positions_count: uint256 = Protocol(self.protocol).last_position_index()
+    for i in range(POSITION_PAGE_SIZE):
+        _index: uint256 = _offset + convert(i, uint256)
+        if convert(i, uint256) >= _limit or _index >= _positions_count:
+            break
+        _page[i] = self.position_row(Protocol(self.protocol).position_index(_index))
+    return _page
+
+
+@public
+@constant
+def expiring_positions_page(_expires_before: uint256, _offset: uint256, _limit: uint256) -> uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]:
+    """
+    @dev Read the open positions expiring before `_expires_before` among up to `_limit`
+         positions by `position_index`, starting from `_offset`. The matching positions
+         are returned first, so the next page starts from `_offset + _limit`.
+    """
+    assert _limit <= convert(POSITION_PAGE_SIZE, uint256)
+    _page: uint256[POSITION_FIELDS][POSITION_PAGE_SIZE]
+    _row_count: int128 = 0
+    _positions_count: uint256 = Protocol(self.protocol).last_position_index()
+    for i in range(POSITION_PAGE_SIZE):
+        _index: uint256 = _offset + convert(i, uint256)
+        if convert(i, uint256) >= _limit or _index >= _positions_count:
+            break
+        _row: uint256[POSITION_FIELDS] = self.position_row(Protocol(self.protocol).position_index(_index))
+        if _row[POSITION_FIELD_STATUS] == POSITION_STATUS_OPEN and _row[POSITION_FIELD_EXPIRES_AT] < _expires_before:
+            _page[_row_count] = _row
+            _row_count += 1
+    return _page
@@ -3,48 +3,29 @@
 # https://certificate.quantstamp.com/view/lendroid-protocol-version-1-0
 
 
-# struct representing a kernel
-struct Kernel:
-    lender: address
-    borrower: address
-    relayer: address
-    wrangler: address
-    borrow_currency_address: address
-    lend_currency_address: address
-    lend_currency_offered_value: uint256
-    relayer_fee: uint256
-    monitoring_fee: uint256
-    rollover_fee: uint256
-    closure_fee: uint256
-    salt: bytes32
-    expires_at: timestamp
-    daily_interest_rate: uint256
-    position_duration_in_seconds: timedelta
-
 # struct representing a position
+# The index, status and timestamps share the `packed_state` slot, laid out
+# from the lowest bit as:
+#   status (8 bits) | index (56 bits) | created_at (64 bits) | updated_at (64 bits) | expires_at (64 bits)
+# The position hash is the storage key, so it is not stored again.
 struct Position:
-    index: uint256
     kernel_creator: address
     lender: address
     borrower: address
     relayer: address
     wrangler: address
-    created_at: timestamp
-    updated_at: timestamp
-    expires_at: timestamp
     borrow_currency_address: address
     lend_currency_address: address
     borrow_currency_value: uint256
     borrow_currency_current_value: uint256
     lend_currency_filled_value: uint256
     lend_currency_owed_value: uint256
-    status: uint256
     nonce: uint256
     relayer_fee: uint256
     monitoring_fee: uint256
     rollover_fee: uint256
     closure_fee: uint256
-    hash: bytes32
+    packed_state: uint256
 
 # Interface for the ERC20 contract, used mainly for `transfer` and `transferFrom` functions
 contract ERC20:
@@ -58,44 +39,111 @@ contract ERC20:
     def approve(_spender: address, _amount: uint256) -> bool: modifying
     def allowance(_owner: address, _spender: address) -> uint256: constant
 
+# maximum number of kernels that can be filled in a single `fill_kernels` call
+FILL_KERNELS_BATCH_SIZE: constant(int128) = 5
+# maximum number of positions that can be updated in a single topup / liquidate / close call
+POSITION_BATCH_SIZE: constant(int128) = 20
+
+# constants
+SECONDS_PER_DAY: constant(uint256) = 86400
+POSITION_STATUS_OPEN: constant(uint256) = 1
+POSITION_STATUS_CLOSED: constant(uint256) = 2
+POSITION_STATUS_LIQUIDATED: constant(uint256) = 3
+# keys of the values notified by position, kernel creator and protocol parameter updates
+POSITION_NOTIFICATION_STATUS: constant(uint256) = 1
+POSITION_NOTIFICATION_BORROW_CURRENCY_VALUE: constant(uint256) = 2
+POSITION_NOTIFICATION_EXPIRES_AT: constant(uint256) = 3
+KERNEL_CREATOR_NOTIFICATION_MIN_SALT: constant(uint256) = 1
+PROTOCOL_NOTIFICATION_POSITION_THRESHOLD: constant(uint256) = 1
+PROTOCOL_NOTIFICATION_WRANGLER_STATUS: constant(uint256) = 2
+PROTOCOL_NOTIFICATION_TOKEN_SUPPORT: constant(uint256) = 3
+PROTOCOL_NOTIFICATION_ARCHIVE_POSITIONS: constant(uint256) = 4
+# bit offsets and masks of the fields packed into `Position.packed_state`
+PACKED_INDEX_OFFSET: constant(int128) = 8
+PACKED_CREATED_AT_OFFSET: constant(int128) = 64
+PACKED_UPDATED_AT_OFFSET: constant(int128) = 128
+PACKED_EXPIRES_AT_OFFSET: constant(int128) = 192
+PACKED_STATUS_MASK: constant(uint256) = 255
+PACKED_INDEX_MASK: constant(uint256) = 72057594037927935
+PACKED_TIMESTAMP_MASK: constant(uint256) = 18446744073709551615
+# bit offset and mask of the borrow and lend indices packed into `position_account_indices`
+ACCOUNT_LEND_INDEX_OFFSET: constant(int128) = 128
+ACCOUNT_INDEX_MASK: constant(uint256) = 340282366920938463463374607431768211455
+# signature schemes, selected by an optional 66th byte of the signature
+# legacy signatures are checked against the raw hash, then the eth_sign prefixed hash
+SIGNATURE_SCHEME_LEGACY: constant(uint256) = 0
+# EIP-712 typed data signatures are recovered once from the typed data hash
+SIGNATURE_SCHEME_EIP712: constant(uint256) = 1
+# eth_sign signatures are recovered once from the prefixed hash
+SIGNATURE_SCHEME_ETH_SIGN: constant(uint256) = 2
+# maximum depth of a kernel batch Merkle tree
+KERNEL_BATCH_MAX_DEPTH: constant(int128) = 16
+# states of the reentrancy lock
+REENTRANCY_UNLOCKED: constant(uint256) = 1
+REENTRANCY_LOCKED: constant(uint256) = 2
+# keccak256("EIP712Domain(string name,string version,address verifyingContract)")
+EIP712_DOMAIN_TYPEHASH: constant(bytes32) = 0x91ab3d17e3a50a9d89e63fd30b92be7f5336b03b287bb946787a83a9d62a2766
+# keccak256("Kernel(address lender,address borrower,address relayer,address wrangler,address collateralToken,address loanToken,uint256 loanAmountOffered,uint256 relayerFeeLST,uint256 monitoringFeeLST,uint256 rolloverFeeLST,uint256 closureFeeLST,bytes32 creatorSalt,uint256 offerExpiryTimestamp,uint256 loanInterestRatePerDay,uint256 loanDuration)")
+KERNEL_TYPEHASH: constant(bytes32) = 0x1af43e3cc5c00c11c173d4286a73a1354f2bc413aafaa80f1d746aaf0767e811
+# keccak256("Position(address collateralToken,address loanToken,uint256 collateralAmount,uint256 loanAmountFilled,uint256 loanAmountOwed,address kernelCreator,address lender,address borrower,address relayer,address wrangler,uint256 relayerFeeLST,uint256 monitoringFeeLST,uint256 rolloverFeeLST,uint256 closureFeeLST,uint256 nonce)")
+POSITION_TYPEHASH: constant(bytes32) = 0x20109c5ed193dce0b6f27356c8fda5287b978c97d39e9d8ec65110faf15cadc8
+
 # Events of the protocol.
-ProtocolParameterUpdateNotification: event({_notification_key: string[64], _address: indexed(address), _notification_value: uint256})
-PositionUpdateNotification: event({_wrangler: indexed(address), _position_hash: indexed(bytes32), _notification_key: string[64], _notification_value: uint256})
+ProtocolParameterUpdateNotification: event({_notification_key: uint256, _address: indexed(address), _notification_value: uint256})
+# positions are followed by their hash, borrower or lender, the wrangler is the only party not indexed
+PositionUpdateNotification: event({_wrangler: address, _borrower: indexed(address), _lender: indexed(address), _position_hash: indexed(bytes32), _notification_key: uint256, _notification_value: uint256})
+KernelCreatorUpdateNotification: event({_kernel_creator: indexed(address), _notification_key: uint256, _notification_value: uint256})
+# the remaining value of a kernel is the part of its offered loan amount neither filled nor cancelled
+KernelFilled: event({_kernel_hash: indexed(bytes32), _kernel_creator: indexed(address), _filled_value: uint256, _remaining_value: uint256})
+KernelCancelled: event({_kernel_hash: indexed(bytes32), _kernel_creator: indexed(address), _cancelled_value: uint256, _remaining_value: uint256})
+KernelRegistered: event({_kernel_hash: indexed(bytes32), _kernel_creator: indexed(address), _is_registered: bool})
+PositionArchiveNotification: event({_wrangler: indexed(address), _position_hash: indexed(bytes32), _kernel_creator: address, _lender: address, _borrower: address, _relayer: address, _borrow_currency_address: address, _lend_currency_address: address, _borrow_currency_value: uint256, _borrow_currency_current_value: uint256, _lend_currency_filled_value: uint256, _lend_currency_owed_value: uint256, _nonce: uint256, _relayer_fee: uint256, _monitoring_fee: uint256, _rollover_fee: uint256, _closure_fee: uint256, _packed_state: uint256})
 
 # Variables of the protocol.
 protocol_token_address: public(address)
 owner: public(address)
+# EIP-712 domain separator of this deployment
+domain_separator: public(bytes32)
 # kernel
 kernels_filled: public(map(bytes32, uint256))
 kernels_cancelled: public(map(bytes32, uint256))
+# kernels whose salt is below their creator's minimum salt are cancelled
+kernel_creator_min_salts: public(map(address, uint256))
+# creators of the kernel batch Merkle roots with a verified signature
+kernel_batch_signers: public(map(bytes32, address))
+# kernels registered on-chain by their creator, which are filled without a signature
+kernels_registered: public(map(address, map(bytes32, bool)))
 # all positions
-positions: public(map(bytes32, Position))
+positions: map(bytes32, Position)
 last_position_index: public(uint256)
 position_index: public(map(uint256, bytes32))
 position_threshold: public(uint256)
+# closed and liquidated positions are archived when set
+archive_positions: public(bool)
 borrow_positions: public(map(address, map(uint256, bytes32)))
 lend_positions: public(map(address, map(uint256, bytes32)))
-borrow_position_index: map(address, map(bytes32, uint256))
-lend_position_index: map(address, map(bytes32, uint256))
+# indices of each position in its borrower's and lender's positions, laid out as
+#   borrow index (128 bits) | lend index (128 bits)
+position_account_indices: map(bytes32, uint256)
 borrow_positions_count: public(map(address, uint256))
 lend_positions_count: public(map(address, uint256))
 
 # wrangler
 wranglers: public(map(address, bool))
-wrangler_nonces: public(map(address, map(address, uint256)))
+# used approval nonces per wrangler and kernel creator, 256 nonces per word
+wrangler_nonce_bitmaps: public(map(address, map(address, map(uint256, uint256))))
 
 # tokens
 supported_tokens: public(map(address, bool))
+# token balances deposited in the protocol, per token and owner
+token_balances: public(map(address, map(address, uint256)))
+# total deposited balance per token, which the escape hatch leaves in the protocol
+token_deposits: public(map(address, uint256))
+# accounts whose received payments are credited to their deposited balances
+vault_accounts: public(map(address, bool))
 
-# nonreentrant locks for positions, inspired from https://github.com/ethereum/vyper/issues/1204
-nonreentrant_locks: map(bytes32, bool)
-
-# constants
-SECONDS_PER_DAY: public(uint256)
-POSITION_STATUS_OPEN: public(uint256)
-POSITION_STATUS_CLOSED: public(uint256)
-POSITION_STATUS_LIQUIDATED: public(uint256)
-POSITION_TOPPED_UP: public(uint256)
+# reentrancy lock, taken once per call by the entry points that update positions
+reentrancy_lock: uint256
 
 
 @public
@@ -103,11 +151,15 @@ def __init__(_protocol_token_address: address):
     self.owner = msg.sender
     self.protocol_token_address = _protocol_token_address
     self.position_threshold = 10
-    self.SECONDS_PER_DAY = 86400
-    self.POSITION_STATUS_OPEN = 1
-    self.POSITION_STATUS_CLOSED = 2
-    self.POSITION_STATUS_LIQUIDATED = 3
-    self.POSITION_TOPPED_UP = 1
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+    self.domain_separator = sha3(
+        concat(
+            EIP712_DOMAIN_TYPEHASH,
+            sha3("Lendroid Protocol"),# name
+            sha3("1"),# version
+            convert(self, bytes32)# verifyingContract
+        )
+    )
 
 
 # constant functions
@@ -122,22 +174,81 @@ def ecrecover_from_signature(_hash: bytes32, _sig: bytes[65]) -> address:
     """
     if len(_sig) != 65:
         return ZERO_ADDRESS
-    v: int128 = convert(slice(_sig, start=64, len=1), int128)
+    v: uint256 = bitwise_and(extract32(_sig, 33, type=uint256), 255)
     if v < 27:
         v += 27
-    if v in [27, 28]:
-        return ecrecover(_hash, convert(v, uint256), extract32(_sig, 0, type=uint256), extract32(_sig, 32, type=uint256))
+    if v == 27 or v == 28:
+        return ecrecover(_hash, v, extract32(_sig, 0, type=uint256), extract32(_sig, 32, type=uint256))
     return ZERO_ADDRESS
 
 
 @public
 @constant
-def is_signer(_prover: address, _hash: bytes32, _sig: bytes[65]) -> bool:
-    if _prover == self.ecrecover_from_signature(_hash, _sig):
-        return True
-    else:
-        sign_prefix: bytes[32] = "\x19Ethereum Signed Message:\n32"
-        return _prover == self.ecrecover_from_signature(sha3(concat(sign_prefix, _hash)), _sig)
+def is_signer(_prover: address, _hash: bytes32, _sig: bytes[578]) -> bool:
+    """
+    @dev Check a signature of the given EIP-712 hash, in the scheme selected by its optional 66th byte
+    @param _sig bytes v, r, s of the signature, optionally followed by the scheme selector
+    """
+    if (len(_sig) < 65) or (len(_sig) > 66):
+        return False
+    _scheme: uint256 = SIGNATURE_SCHEME_LEGACY
+    if len(_sig) > 65:
+        _scheme = bitwise_and(extract32(_sig, 34, type=uint256), 255)
+    _signature: bytes[65] = slice(_sig, start=0, len=65)
+    if _scheme > SIGNATURE_SCHEME_ETH_SIGN:
+        return False
+    sign_prefix: bytes[32] = "\x19Ethereum Signed Message:\n32"
+    _prefixed_hash: bytes32 = sha3(concat(sign_prefix, _hash))
+    # EIP-712 and legacy signatures are checked against the hash itself
+    _signed_hash: bytes32 = _hash
+    if _scheme == SIGNATURE_SCHEME_ETH_SIGN:
+        _signed_hash = _prefixed_hash
+    for i in range(2):
+        if _prover == self.ecrecover_from_signature(_signed_hash, _signature):
+            return True
+        # only legacy signatures fall back to the eth_sign prefixed hash
+        if _scheme != SIGNATURE_SCHEME_LEGACY:
+            break
+        _signed_hash = _prefixed_hash
+    return False
+
+
+@public
+@constant
+def kernel_signed_hash(_kernel_creator: address, _kernel_hash: bytes32, _sig_data: bytes[578]) -> bytes32:
+    """
+    @dev Check the kernel creator's signature of a kernel, alone or in a batch, or the kernel's registration
+    @param _sig_data bytes v, r, s and signature scheme of the kernel or of its batch's Merkle root, followed by
+           the kernel's Merkle proof for a batch, or empty for a registered kernel
+    @return the kernel hash or Merkle root signed by the kernel creator, or an empty hash if there is none
+    """
+    # a registration stands in for the signature
+    if len(_sig_data) == 0:
+        if self.kernels_registered[_kernel_creator][_kernel_hash]:
+            return _kernel_hash
+        return EMPTY_BYTES32
+    _signed_hash: bytes32 = _kernel_hash
+    _signature: bytes[578] = _sig_data
+    if len(_sig_data) > 66:
+        # the batch signature is followed by the kernel's proof, whose nodes are hashed
+        # with the current node in ascending order
+        _signature = slice(_sig_data, start=0, len=66)
+        _proof_offset: int128 = 66
+        for i in range(KERNEL_BATCH_MAX_DEPTH):
+            if _proof_offset >= len(_sig_data):
+                break
+            _sibling: bytes32 = extract32(_sig_data, _proof_offset)
+            if convert(_signed_hash, uint256) < convert(_sibling, uint256):
+                _signed_hash = sha3(concat(_signed_hash, _sibling))
+            else:
+                _signed_hash = sha3(concat(_sibling, _signed_hash))
+            _proof_offset += 32
+    # the signatures of batch roots are only recovered once
+    if self.kernel_batch_signers[_signed_hash] == _kernel_creator:
+        return _signed_hash
+    if self.is_signer(_kernel_creator, _signed_hash, _signature):
+        return _signed_hash
+    return EMPTY_BYTES32
 
 
 @public
@@ -152,6 +263,12 @@ def can_lend(_address: address) -> bool:
     return self.lend_positions_count[_address] < self.position_threshold
 
 
+@public
+@constant
+def is_wrangler_nonce_used(_wrangler: address, _kernel_creator: address, _nonce: uint256) -> bool:
+    return bitwise_and(self.wrangler_nonce_bitmaps[_wrangler][_kernel_creator][_nonce / 256], shift(1, convert(_nonce % 256, int128))) != 0
+
+
 @public
 @constant
 def filled_or_cancelled_loan_amount(_kernel_hash: bytes32) -> uint256:
@@ -160,9 +277,16 @@ def filled_or_cancelled_loan_amount(_kernel_hash: bytes32) -> uint256:
 
 @public
 @constant
-def position(_position_hash: bytes32) -> (uint256, address, address, address, address, address, timestamp, timestamp, timestamp, address, address, uint256, uint256,
+def position(_position_hash: bytes32) -> (uint256, address, address, address, address, address, uint256, uint256, uint256, address, address, uint256, uint256,
     uint256, uint256, uint256, uint256, uint256, uint256, uint256, uint256, bytes32):
-    return (self.positions[_position_hash].index, self.positions[_position_hash].kernel_creator, self.positions[_position_hash].lender, self.positions[_position_hash].borrower, self.positions[_position_hash].relayer, self.positions[_position_hash].wrangler, self.positions[_position_hash].created_at, self.positions[_position_hash].updated_at, self.positions[_position_hash].expires_at, self.positions[_position_hash].borrow_currency_address, self.positions[_position_hash].lend_currency_address, self.positions[_position_hash].borrow_currency_value, self.positions[_position_hash].borrow_currency_current_value, self.positions[_position_hash].lend_currency_filled_value, self.positions[_position_hash].lend_currency_owed_value, self.positions[_position_hash].status, self.positions[_position_hash].nonce, self.positions[_position_hash].relayer_fee, self.positions[_position_hash].monitoring_fee, self.positions[_position_hash].rollover_fee, self.positions[_position_hash].closure_fee, self.positions[_position_hash].hash)
+    _position: Position = self.positions[_position_hash]
+    _packed_state: uint256 = _position.packed_state
+    # the hash is only returned for positions that exist
+    # archived positions only keep their index, timestamps and status
+    _hash: bytes32 = EMPTY_BYTES32
+    if _packed_state != 0:
+        _hash = _position_hash
+    return (bitwise_and(shift(_packed_state, -PACKED_INDEX_OFFSET), PACKED_INDEX_MASK), _position.kernel_creator, _position.lender, _position.borrower, _position.relayer, _position.wrangler, bitwise_and(shift(_packed_state, -PACKED_CREATED_AT_OFFSET), PACKED_TIMESTAMP_MASK), bitwise_and(shift(_packed_state, -PACKED_UPDATED_AT_OFFSET), PACKED_TIMESTAMP_MASK), shift(_packed_state, -PACKED_EXPIRES_AT_OFFSET), _position.borrow_currency_address, _position.lend_currency_address, _position.borrow_currency_value, _position.borrow_currency_current_value, _position.lend_currency_filled_value, _position.lend_currency_owed_value, bitwise_and(_packed_state, PACKED_STATUS_MASK), _position.nonce, _position.relayer_fee, _position.monitoring_fee, _position.rollover_fee, _position.closure_fee, _hash)
 
 
 @public
@@ -178,9 +302,10 @@ def kernel_hash(
         _kernel_expires_at: timestamp, _creator_salt: bytes32,
         _daily_interest_rate: uint256, _position_duration_in_seconds: timedelta
         ) -> bytes32:
-    return sha3(
+    # EIP-712 hash of the kernel
+    return sha3(concat(b"\x19\x01", self.domain_separator, sha3(
         concat(
-            convert(self, bytes32),
+            KERNEL_TYPEHASH,
             convert(_addresses[0], bytes32),# lender
             convert(_addresses[1], bytes32),# borrower
             convert(_addresses[2], bytes32),# relayer
@@ -197,7 +322,7 @@ def kernel_hash(
             convert(_daily_interest_rate, bytes32),# loanInterestRatePerDay
             convert(_position_duration_in_seconds, bytes32)# loanDuration
         )
-    )
+    )))
 
 
 @public
@@ -209,9 +334,10 @@ def position_hash(
             # _values: collateralAmount, loanAmountOffered, relayerFeeLST, monitoringFeeLST, rolloverFeeLST, closureFeeLST, loanAmountFilled
             _lend_currency_owed_value: uint256, _nonce: uint256
         ) -> bytes32:
-    return sha3(
+    # EIP-712 hash of the position
+    return sha3(concat(b"\x19\x01", self.domain_separator, sha3(
         concat(
-            convert(self, bytes32),
+            POSITION_TYPEHASH,
             convert(_addresses[5], bytes32),# collateralToken
             convert(_addresses[6], bytes32),# loanToken
             convert(_values[0], bytes32),# collateralAmount
@@ -228,7 +354,7 @@ def position_hash(
             convert(_values[5], bytes32),# closureFeeLST
             convert(_nonce, bytes32)# nonce
         )
-    )
+    )))
 
 
 @public
@@ -239,19 +365,55 @@ def owed_value(
         _position_duration_in_seconds: timedelta
     ) -> uint256:
     # calculate owed value
-    _position_duration_in_days: uint256 = as_unitless_number(_position_duration_in_seconds) / as_unitless_number(self.SECONDS_PER_DAY)
-    _total_interest: uint256 = as_unitless_number(_filled_value) * as_unitless_number(_position_duration_in_days) * as_unitless_number(_kernel_daily_interest_rate) / 10 ** 20
+    _position_duration_in_days: uint256 = as_unitless_number(_position_duration_in_seconds) / as_unitless_number(SECONDS_PER_DAY)
+    _total_interest: uint256 = as_unitless_number(_filled_value) * as_unitless_number(_position_duration_in_days)
+    _total_interest = _total_interest * as_unitless_number(_kernel_daily_interest_rate) / 10 ** 20
     return as_unitless_number(_filled_value) + as_unitless_number(_total_interest)
 
 
+@public
+@constant
+def fill_state(_addresses: address[6], _values: uint256[7], _nonce: uint256, _kernel_daily_interest_rate: uint256, _is_creator_lender: bool,
+        _kernel_expires_at: timestamp, _position_duration_in_seconds: timedelta, _kernel_creator_salt: bytes32,
+        _sig_data_kernel_creator: bytes[578]) -> (bool, bool, bool, bool, bool, bool, bool, uint256, uint256, uint256):
+    """
+    @dev Read the state checked by `fill_kernel`, for the `fill_kernel` arguments of a kernel signed alone or in a batch, or registered
+    @return support of the collateral and loan tokens, wrangler's activation status, use of the
+            wrangler's nonce, borrower's and lender's position thresholds, validity of the kernel
+            creator's signature or registration, kernel creator's minimum salt, filled or cancelled
+            and remaining fillable loan amounts of the kernel
+    """
+    # the kernel is signed by its lender with an empty borrower, or the other way round
+    _kernel_creator: address = _addresses[1]
+    _kernel_lender: address = ZERO_ADDRESS
+    _kernel_borrower: address = _addresses[1]
+    if _is_creator_lender:
+        _kernel_creator = _addresses[0]
+        _kernel_lender = _addresses[0]
+        _kernel_borrower = ZERO_ADDRESS
+    _k_hash: bytes32 = self.kernel_hash(
+        [_kernel_lender, _kernel_borrower, _addresses[2], _addresses[3], _addresses[4], _addresses[5]],
+        [_values[1], _values[2], _values[3], _values[4], _values[5]],
+        _kernel_expires_at, _kernel_creator_salt, _kernel_daily_interest_rate, _position_duration_in_seconds)
+    # the remaining value is zero once the kernel is entirely filled or cancelled
+    _filled_or_cancelled_value: uint256 = self.filled_or_cancelled_loan_amount(_k_hash)
+    _remaining_value: uint256 = 0
+    if as_unitless_number(_values[1]) > as_unitless_number(_filled_or_cancelled_value):
+        _remaining_value = _values[1] - _filled_or_cancelled_value
+    return (self.supported_tokens[_addresses[4]], self.supported_tokens[_addresses[5]], self.wranglers[_addresses[3]],
+        self.is_wrangler_nonce_used(_addresses[3], _kernel_creator, _nonce),
+        self.borrow_positions_count[_addresses[1]] < self.position_threshold, self.lend_positions_count[_addresses[0]] < self.position_threshold,
+        self.kernel_signed_hash(_kernel_creator, _k_hash, _sig_data_kernel_creator) != EMPTY_BYTES32, self.kernel_creator_min_salts[_kernel_creator], _filled_or_cancelled_value, _remaining_value)
+
+
 # escape hatch functions
 @public
 def escape_hatch_token(_token_address: address) -> bool:
     assert msg.sender == self.owner
-    # transfer token from this address to owner (message sender)
+    # transfer token from this address to owner (message sender), except the deposited balances
     token_transfer: bool = ERC20(_token_address).transfer(
         msg.sender,
-        ERC20(_token_address).balanceOf(self)
+        ERC20(_token_address).balanceOf(self) - self.token_deposits[_token_address]
     )
     assert token_transfer
     return True
@@ -262,7 +424,7 @@ def escape_hatch_token(_token_address: address) -> bool:
 def set_position_threshold(_value: uint256) -> bool:
     assert msg.sender == self.owner
     self.position_threshold = _value
-    log.ProtocolParameterUpdateNotification("position_threshold", ZERO_ADDRESS, _value)
+    log.ProtocolParameterUpdateNotification(PROTOCOL_NOTIFICATION_POSITION_THRESHOLD, ZERO_ADDRESS, _value)
     return True
 
 
@@ -270,7 +432,7 @@ def set_position_threshold(_value: uint256) -> bool:
 def set_wrangler_status(_address: address, _is_active: bool) -> bool:
     assert msg.sender == self.owner
     self.wranglers[_address] = _is_active
-    log.ProtocolParameterUpdateNotification("wrangler_status", _address, convert(_is_active, uint256))
+    log.ProtocolParameterUpdateNotification(PROTOCOL_NOTIFICATION_WRANGLER_STATUS, _address, convert(_is_active, uint256))
     return True
 
 
@@ -279,243 +441,443 @@ def set_token_support(_address: address, _is_active: bool) -> bool:
     assert msg.sender == self.owner
     assert _address.is_contract
     self.supported_tokens[_address] = _is_active
-    log.ProtocolParameterUpdateNotification("token_support", _address, convert(_is_active, uint256))
+    log.ProtocolParameterUpdateNotification(PROTOCOL_NOTIFICATION_TOKEN_SUPPORT, _address, convert(_is_active, uint256))
+    return True
+
+
+@public
+def set_archive_positions(_is_active: bool) -> bool:
+    assert msg.sender == self.owner
+    self.archive_positions = _is_active
+    log.ProtocolParameterUpdateNotification(PROTOCOL_NOTIFICATION_ARCHIVE_POSITIONS, ZERO_ADDRESS, convert(_is_active, uint256))
     return True
 
 
 # internal functions
-@private
-def lock_position(_position_hash: bytes32):
-    assert self.nonreentrant_locks[_position_hash] == False
-    self.nonreentrant_locks[_position_hash] = True
-
-
-@private
-def unlock_position(_position_hash: bytes32):
-    assert self.nonreentrant_locks[_position_hash] == True
-    self.nonreentrant_locks[_position_hash] = False
-
-
-@private
-def record_position(_lender: address, _borrower: address, _position_hash: bytes32):
-    assert self.can_borrow(_borrower)
-    assert self.can_lend(_lender)
-    # borrow position
-    self.borrow_positions_count[_borrower] += 1
-    self.borrow_position_index[_borrower][_position_hash] = self.borrow_positions_count[_borrower]
-    self.borrow_positions[_borrower][self.borrow_positions_count[_borrower]] = _position_hash
-    # lend position
-    self.lend_positions_count[_lender] += 1
-    self.lend_position_index[_lender][_position_hash] = self.lend_positions_count[_lender]
-    self.lend_positions[_lender][self.lend_positions_count[_lender]] = _position_hash
-
-
-@private
-def remove_position(_position_hash: bytes32):
-    _borrower: address = self.positions[_position_hash].borrower
-    _lender: address = self.positions[_position_hash].lender
-    # update borrow position indices
-    _current_position_index: uint256 = self.borrow_position_index[_borrower][_position_hash]
-    _last_position_index: uint256 = self.borrow_positions_count[_borrower]
-    _last_position_hash: bytes32 = self.borrow_positions[_borrower][_last_position_index]
-    self.borrow_positions[_borrower][_current_position_index] = self.borrow_positions[_borrower][_last_position_index]
-    self.borrow_positions[_borrower][_last_position_index] = EMPTY_BYTES32
-    self.borrow_position_index[_borrower][_position_hash] = 0
-    self.borrow_position_index[_borrower][_last_position_hash] = _current_position_index
-    self.borrow_positions_count[_borrower] -= 1
-    # update lend position indices
-    _current_position_index = self.lend_position_index[_lender][_position_hash]
-    _last_position_index = self.lend_positions_count[_lender]
-    _last_position_hash = self.lend_positions[_lender][_last_position_index]
-    self.lend_positions[_lender][_current_position_index] = self.lend_positions[_lender][_last_position_index]
-    self.lend_positions[_lender][_last_position_index] = EMPTY_BYTES32
-    self.lend_position_index[_lender][_position_hash] = 0
-    self.lend_position_index[_lender][_last_position_hash] = _current_position_index
-    self.lend_positions_count[_lender] -= 1
+@public
+def transfer_token(_token_address: address, _from: address, _to: address, _value: uint256):
+    # this is a `fake internal` function for now!
+    assert msg.sender == self
+    token_transfer: bool = False
+    if _from != self:
+        if as_unitless_number(self.token_balances[_token_address][_from]) < as_unitless_number(_value):
+            # transfer from the sender's balance outside of the deposits
+            token_transfer = ERC20(_token_address).transferFrom(
+                _from,
+                _to,
+                _value
+            )
+            assert token_transfer
+            return
+        # pay from the deposited balance, crediting the deposited balance of a recipient in the vault
+        self.token_balances[_token_address][_from] -= _value
+        if self.vault_accounts[_to]:
+            self.token_balances[_token_address][_to] += _value
+            return
+        # the payment leaves the deposits, and is transferred to recipients outside of the vault
+        self.token_deposits[_token_address] -= _value
+        if _to == self:
+            return
+    # transfer from this address
+    token_transfer = ERC20(_token_address).transfer(
+        _to,
+        _value
+    )
+    assert token_transfer
 
 
 @public
-def open_position(
-        _kernel_creator: address,
+def try_fill_kernel(
         _addresses: address[6],
-        # _addresses: lender, borrower, relayer, wrangler, collateralToken, loanToken
         _values: uint256[7],
-        # _values: collateralAmount, loanAmountOffered, relayerFeeLST, monitoringFeeLST, rolloverFeeLST, closureFeeLST, loanAmountFilled (aka, loanAmountBorrowed)
         _nonce: uint256,
         _kernel_daily_interest_rate: uint256,
+        _is_creator_lender: bool,
+        _timestamps: timestamp[2],
         _position_duration_in_seconds: timedelta,
-        _approval_expires: timestamp,
-        _sig_data: bytes[65]
-        # v, r, s of wrangler
-    ):
+        _kernel_creator_salt: bytes32,
+        _sig_data_kernel_creator: bytes[578],
+        _sig_data_wrangler: bytes[66],
+        _protocol_token_address: address
+        ) -> bool:
     # this is a `fake internal` function for now!
+    # the caller validates token support and the wrangler's activation status
     assert msg.sender == self
+    # validate _lender is not empty
+    if _addresses[0] == ZERO_ADDRESS:
+        return False
+    # validate _borrower is not empty
+    if _addresses[1] == ZERO_ADDRESS:
+        return False
+    # the kernel is signed by its lender with an empty borrower, or the other way round
+    _kernel_creator: address = _addresses[1]
+    _kernel_lender: address = ZERO_ADDRESS
+    _kernel_borrower: address = _addresses[1]
+    if _is_creator_lender:
+        _kernel_creator = _addresses[0]
+        _kernel_lender = _addresses[0]
+        _kernel_borrower = ZERO_ADDRESS
+    # It's OK if _relayer is empty
+    # validate _wrangler is not empty
+    if _addresses[3] == ZERO_ADDRESS:
+        return False
+    # validate loan amounts
+    if not ((as_unitless_number(_values[0]) > 0) and (as_unitless_number(_values[1]) > 0) and (as_unitless_number(_values[6]) > 0)):
+        return False
+    # validate asked and offered expiry timestamps
+    if _timestamps[0] <= block.timestamp:
+        return False
+    # validate daily interest rate on Kernel is greater than 0
+    if as_unitless_number(_kernel_daily_interest_rate) == 0:
+        return False
+    # validate kernel has not been cancelled by its creator's minimum salt
+    if convert(_kernel_creator_salt, uint256) < self.kernel_creator_min_salts[_kernel_creator]:
+        return False
+    # compute hash of kernel
+    _k_hash: bytes32 = self.kernel_hash(
+        [_kernel_lender, _kernel_borrower, _addresses[2], _addresses[3], _addresses[4], _addresses[5]],
+        [_values[1], _values[2], _values[3], _values[4], _values[5]],
+        _timestamps[0], _kernel_creator_salt, _kernel_daily_interest_rate, _position_duration_in_seconds)
+    # validate kernel_creator's signature of the kernel or of its batch, or the kernel's registration
+    _signed_hash: bytes32 = self.kernel_signed_hash(_kernel_creator, _k_hash, _sig_data_kernel_creator)
+    if _signed_hash == EMPTY_BYTES32:
+        return False
+    # later kernels of the batch skip the signature recovery
+    if (_signed_hash != _k_hash) and (self.kernel_batch_signers[_signed_hash] != _kernel_creator):
+        self.kernel_batch_signers[_signed_hash] = _kernel_creator
+    # validate loan amount to be filled
+    _remaining_value: uint256 = _values[1] - self.filled_or_cancelled_loan_amount(_k_hash)
+    if as_unitless_number(_remaining_value) < as_unitless_number(_values[6]):
+        return False
+    # the wrangler's activation status is validated by the caller
+    # validate wrangler's approval expiry
+    if _timestamps[1] <= block.timestamp:
+        return False
+    # validate wrangler's nonce has not been used
+    _nonce_word_index: uint256 = _nonce / 256
+    _nonce_bit: uint256 = shift(1, convert(_nonce % 256, int128))
+    _nonce_word: uint256 = self.wrangler_nonce_bitmaps[_addresses[3]][_kernel_creator][_nonce_word_index]
+    if bitwise_and(_nonce_word, _nonce_bit) != 0:
+        return False
+    # validate borrower's and lender's position thresholds
+    _position_threshold: uint256 = self.position_threshold
+    _borrow_positions_count: uint256 = self.borrow_positions_count[_addresses[1]]
+    _lend_positions_count: uint256 = self.lend_positions_count[_addresses[0]]
+    if not ((_borrow_positions_count < _position_threshold) and (_lend_positions_count < _position_threshold)):
+        return False
     # calculate owed value
     _lend_currency_owed_value: uint256 = self.owed_value(_values[6], _kernel_daily_interest_rate, _position_duration_in_seconds)
+    _position_hash: bytes32 = self.position_hash([_kernel_creator, _addresses[0], _addresses[1],
+        _addresses[2], _addresses[3], _addresses[4], _addresses[5]],
+        _values, _lend_currency_owed_value, _nonce
+    )
+    # validate wrangler's signature
+    if not self.is_signer(_addresses[3], _position_hash, _sig_data_wrangler):
+        return False
+    # fill offer with lending currency
+    self.kernels_filled[_k_hash] += _values[6]
+    # mark wrangler's nonce for kernel creator as used
+    self.wrangler_nonce_bitmaps[_addresses[3]][_kernel_creator][_nonce_word_index] = bitwise_or(_nonce_word, _nonce_bit)
+    # the index and expiry must fit their fields in `packed_state`
+    _position_index: uint256 = self.last_position_index
+    _expires_at: uint256 = as_unitless_number(block.timestamp + _position_duration_in_seconds)
+    assert (_position_index <= PACKED_INDEX_MASK) and (_expires_at <= PACKED_TIMESTAMP_MASK)
     # create position from struct
-    _new_position: Position = Position({
-        index: self.last_position_index,
+    self.positions[_position_hash] = Position({
         kernel_creator: _kernel_creator,
         lender: _addresses[0],
         borrower: _addresses[1],
         relayer: _addresses[2],
         wrangler: _addresses[3],
-        created_at: block.timestamp,
-        updated_at: block.timestamp,
-        expires_at: block.timestamp + _position_duration_in_seconds,
         borrow_currency_address: _addresses[4],
         lend_currency_address: _addresses[5],
         borrow_currency_value: _values[0],
         borrow_currency_current_value: _values[0],
         lend_currency_filled_value: _values[6],
         lend_currency_owed_value: _lend_currency_owed_value,
-        status: self.POSITION_STATUS_OPEN,
         nonce: _nonce,
         relayer_fee: _values[2],
         monitoring_fee: _values[3],
         rollover_fee: _values[4],
         closure_fee: _values[5],
-        hash: self.position_hash([_kernel_creator, _addresses[0], _addresses[1],
-            _addresses[2], _addresses[3], _addresses[4], _addresses[5]],
-            _values, _lend_currency_owed_value, _nonce
-        )
+        packed_state: bitwise_or(bitwise_or(bitwise_or(bitwise_or(
+            POSITION_STATUS_OPEN,
+            shift(_position_index, PACKED_INDEX_OFFSET)),
+            shift(as_unitless_number(block.timestamp), PACKED_CREATED_AT_OFFSET)),
+            shift(as_unitless_number(block.timestamp), PACKED_UPDATED_AT_OFFSET)),
+            shift(_expires_at, PACKED_EXPIRES_AT_OFFSET))
     })
-    # lock position_non_reentrant before loan creation
-    self.lock_position(_new_position.hash)
-    # validate wrangler's activation status
-    assert self.wranglers[_new_position.wrangler]
-    # validate wrangler's approval expiry
-    assert _approval_expires > block.timestamp
-    # validate wrangler's nonce
-    assert _nonce == self.wrangler_nonces[_new_position.wrangler][_kernel_creator] + 1
-    # increment wrangler's nonce for kernel creator
-    self.wrangler_nonces[_new_position.wrangler][_kernel_creator] += 1
-    # validate wrangler's signature
-    assert self.is_signer(_new_position.wrangler, _new_position.hash, _sig_data)
     # update position index
-    self.position_index[self.last_position_index] = _new_position.hash
-    self.last_position_index += 1
-    self.positions[_new_position.hash] = _new_position
-    # record position
-    self.record_position(_addresses[0], _addresses[1], _new_position.hash)
+    self.position_index[_position_index] = _position_hash
+    self.last_position_index = _position_index + 1
+    # record borrow position
+    _borrow_positions_count += 1
+    self.borrow_positions_count[_addresses[1]] = _borrow_positions_count
+    self.borrow_positions[_addresses[1]][_borrow_positions_count] = _position_hash
+    # record lend position
+    _lend_positions_count += 1
+    self.lend_positions_count[_addresses[0]] = _lend_positions_count
+    self.lend_positions[_addresses[0]][_lend_positions_count] = _position_hash
+    # record the indices of the borrow and lend positions in a single slot
+    self.position_account_indices[_position_hash] = bitwise_or(_borrow_positions_count, shift(_lend_positions_count, ACCOUNT_LEND_INDEX_OFFSET))
     # transfer borrow_currency_current_value from borrower to this address
-    token_transfer: bool = ERC20(_new_position.borrow_currency_address).transferFrom(
-        _new_position.borrower,
-        self,
-        _new_position.borrow_currency_current_value
-    )
-    assert token_transfer
+    self.transfer_token(_addresses[4], _addresses[1], self, _values[0])
     # transfer lend_currency_filled_value from lender to borrower
-    token_transfer = ERC20(_new_position.lend_currency_address).transferFrom(
-        _new_position.lender,
-        _new_position.borrower,
-        _new_position.lend_currency_filled_value
-    )
-    assert token_transfer
+    self.transfer_token(_addresses[5], _addresses[0], _addresses[1], _values[6])
     # transfer monitoring_fee from lender to wrangler
-    token_transfer = ERC20(self.protocol_token_address).transferFrom(
-        _new_position.lender,
-        _new_position.wrangler,
-        _new_position.monitoring_fee
-    )
-    assert token_transfer
+    self.transfer_token(_protocol_token_address, _addresses[0], _addresses[3], _values[3])
     # notify wrangler that a position has been opened
-    log.PositionUpdateNotification(_new_position.wrangler, _new_position.hash, "status", self.POSITION_STATUS_OPEN)
-    # unlock position_non_reentrant after loan creation
-    self.unlock_position(_new_position.hash)
+    log.PositionUpdateNotification(_addresses[3], _addresses[1], _addresses[0], _position_hash, POSITION_NOTIFICATION_STATUS, POSITION_STATUS_OPEN)
+
+    # transfer relayerFeeLST from kernel creator to relayer
+    if (_addresses[2] != ZERO_ADDRESS) and (as_unitless_number(_values[2]) > 0):
+        self.transfer_token(_protocol_token_address, _kernel_creator, _addresses[2], _values[2])
+    # notify of the fill and of the kernel's remaining value
+    log.KernelFilled(_k_hash, _kernel_creator, _values[6], _remaining_value - _values[6])
+
+    return True
 
 
-# external functions
 @public
-def topup_position(_position_hash: bytes32, _borrow_currency_increment: uint256) -> bool:
-    existing_position: Position = self.positions[_position_hash]
+def try_topup_position(_sender: address, _position_hash: bytes32, _borrow_currency_increment: uint256) -> bool:
+    # this is a `fake internal` function for now!
+    assert msg.sender == self
+    _borrower: address = self.positions[_position_hash].borrower
     # confirm sender is borrower
-    assert msg.sender == existing_position.borrower
+    if _sender != _borrower:
+        return False
+    _packed_state: uint256 = self.positions[_position_hash].packed_state
     # confirm position has not expired yet
-    assert existing_position.expires_at >= block.timestamp
+    if shift(_packed_state, -PACKED_EXPIRES_AT_OFFSET) < as_unitless_number(block.timestamp):
+        return False
     # confirm position is still active
-    assert existing_position.status == self.POSITION_STATUS_OPEN
-    # lock position_non_reentrant before topup
-    self.lock_position(_position_hash)
+    if bitwise_and(_packed_state, PACKED_STATUS_MASK) != POSITION_STATUS_OPEN:
+        return False
     # perform topup
-    existing_position.borrow_currency_current_value += _borrow_currency_increment
-    self.positions[_position_hash] = existing_position
+    _borrow_currency_current_value: uint256 = self.positions[_position_hash].borrow_currency_current_value + _borrow_currency_increment
+    self.positions[_position_hash].borrow_currency_current_value = _borrow_currency_current_value
     # transfer borrow_currency_current_value from borrower to this address
-    token_transfer: bool = ERC20(existing_position.borrow_currency_address).transferFrom(
-        existing_position.borrower,
-        self,
-        _borrow_currency_increment
-    )
-    assert token_transfer
+    self.transfer_token(self.positions[_position_hash].borrow_currency_address, _borrower, self, _borrow_currency_increment)
     # Notify wrangler that a position has been topped up
-    log.PositionUpdateNotification(existing_position.wrangler, _position_hash, "borrow_currency_value", self.POSITION_TOPPED_UP)
-    # unlock position_non_reentrant after topup
-    self.unlock_position(_position_hash)
+    log.PositionUpdateNotification(self.positions[_position_hash].wrangler, _borrower, self.positions[_position_hash].lender, _position_hash,
+        POSITION_NOTIFICATION_BORROW_CURRENCY_VALUE, _borrow_currency_current_value)
 
     return True
 
 
 @public
-def liquidate_position(_position_hash: bytes32) -> bool:
-    existing_position: Position = self.positions[_position_hash]
-    # confirm position has expired
-    assert existing_position.expires_at < block.timestamp
-    # confirm sender is lender or wrangler
-    assert ((msg.sender == existing_position.wrangler) or (msg.sender == existing_position.lender))
+def try_settle_position(_sender: address, _position_hash: bytes32, _status: uint256) -> bool:
+    # this is a `fake internal` function for now!
+    # _status is POSITION_STATUS_CLOSED to close the position, or POSITION_STATUS_LIQUIDATED to liquidate it
+    assert msg.sender == self
+    _packed_state: uint256 = self.positions[_position_hash].packed_state
+    _borrower: address = self.positions[_position_hash].borrower
+    _lender: address = self.positions[_position_hash].lender
+    _wrangler: address = self.positions[_position_hash].wrangler
+    _is_expired: bool = shift(_packed_state, -PACKED_EXPIRES_AT_OFFSET) < as_unitless_number(block.timestamp)
+    if _status == POSITION_STATUS_LIQUIDATED:
+        # confirm position has expired
+        if not _is_expired:
+            return False
+        # confirm sender is lender or wrangler
+        if not ((_sender == _wrangler) or (_sender == _lender)):
+            return False
+    else:
+        # confirm position has not expired yet
+        if _is_expired:
+            return False
+        # confirm sender is borrower
+        if _sender != _borrower:
+            return False
     # confirm position is still active
-    assert existing_position.status == self.POSITION_STATUS_OPEN
-    # lock position_non_reentrant before liquidation
-    self.lock_position(_position_hash)
-    # perform liquidation
-    existing_position.status = self.POSITION_STATUS_LIQUIDATED
-    self.positions[_position_hash] = existing_position
-    self.remove_position(_position_hash)
+    if bitwise_and(_packed_state, PACKED_STATUS_MASK) != POSITION_STATUS_OPEN:
+        return False
+    # perform settlement
+    # the status occupies the lowest bits of packed_state and is open at this point, so xor-ing
+    # it with both the open and the new status replaces it
+    self.positions[_position_hash].packed_state = bitwise_xor(_packed_state, bitwise_xor(_status, POSITION_STATUS_OPEN))
+    # the position is swapped with the last position of its borrower and lender, which is then popped
+    _account_indices: uint256 = self.position_account_indices[_position_hash]
+    self.position_account_indices[_position_hash] = 0
+    _last_position_hash: bytes32
+    # update borrow position indices
+    _current_position_index: uint256 = bitwise_and(_account_indices, ACCOUNT_INDEX_MASK)
+    _last_position_index: uint256 = self.borrow_positions_count[_borrower]
+    if _current_position_index != _last_position_index:
+        _last_position_hash = self.borrow_positions[_borrower][_last_position_index]
+        self.borrow_positions[_borrower][_current_position_index] = _last_position_hash
+        # the borrow index occupies the lowest bits, so xor-ing it with both indices replaces it
+        self.position_account_indices[_last_position_hash] = bitwise_xor(
+            self.position_account_indices[_last_position_hash],
+            bitwise_xor(_last_position_index, _current_position_index))
+    self.borrow_positions[_borrower][_last_position_index] = EMPTY_BYTES32
+    self.borrow_positions_count[_borrower] = _last_position_index - 1
+    # update lend position indices
+    _current_position_index = shift(_account_indices, -ACCOUNT_LEND_INDEX_OFFSET)
+    _last_position_index = self.lend_positions_count[_lender]
+    if _current_position_index != _last_position_index:
+        _last_position_hash = self.lend_positions[_lender][_last_position_index]
+        self.lend_positions[_lender][_current_position_index] = _last_position_hash
+        self.position_account_indices[_last_position_hash] = bitwise_xor(
+            self.position_account_indices[_last_position_hash],
+            shift(bitwise_xor(_last_position_index, _current_position_index), ACCOUNT_LEND_INDEX_OFFSET))
+    self.lend_positions[_lender][_last_position_index] = EMPTY_BYTES32
+    self.lend_positions_count[_lender] = _last_position_index - 1
+    if _status == POSITION_STATUS_CLOSED:
+        # transfer lend_currency_owed_value from borrower to lender
+        self.transfer_token(self.positions[_position_hash].lend_currency_address, _borrower, _lender, self.positions[_position_hash].lend_currency_owed_value)
     # transfer borrow_currency_current_value from this address to the sender
-    token_transfer: bool = ERC20(existing_position.borrow_currency_address).transfer(
-        msg.sender,
-        existing_position.borrow_currency_current_value
-    )
-    assert token_transfer
-    # notify wrangler that a position has been liquidated
-    log.PositionUpdateNotification(existing_position.wrangler, _position_hash, "status", self.POSITION_STATUS_LIQUIDATED)
-    # unlock position_non_reentrant after liquidation
-    self.unlock_position(_position_hash)
+    self.transfer_token(self.positions[_position_hash].borrow_currency_address, self, _sender, self.positions[_position_hash].borrow_currency_current_value)
+    # notify wrangler that a position has been closed or liquidated
+    log.PositionUpdateNotification(_wrangler, _borrower, _lender, _position_hash, POSITION_NOTIFICATION_STATUS, _status)
+    # archive the position
+    if self.archive_positions:
+        _position: Position = self.positions[_position_hash]
+        # notify wrangler of the final position, as its storage is cleared
+        log.PositionArchiveNotification(_position.wrangler, _position_hash, _position.kernel_creator, _position.lender, _position.borrower, _position.relayer, _position.borrow_currency_address, _position.lend_currency_address, _position.borrow_currency_value, _position.borrow_currency_current_value, _position.lend_currency_filled_value, _position.lend_currency_owed_value, _position.nonce, _position.relayer_fee, _position.monitoring_fee, _position.rollover_fee, _position.closure_fee, _position.packed_state)
+        # clear the position index, and all fields but the packed status, index and timestamps
+        self.position_index[bitwise_and(shift(_position.packed_state, -PACKED_INDEX_OFFSET), PACKED_INDEX_MASK)] = EMPTY_BYTES32
+        # the fields are cleared one by one, as clearing packed_state and writing it back would be a fresh SSTORE
+        clear(self.positions[_position_hash].kernel_creator)
+        clear(self.positions[_position_hash].lender)
+        clear(self.positions[_position_hash].borrower)
+        clear(self.positions[_position_hash].relayer)
+        clear(self.positions[_position_hash].wrangler)
+        clear(self.positions[_position_hash].borrow_currency_address)
+        clear(self.positions[_position_hash].lend_currency_address)
+        clear(self.positions[_position_hash].borrow_currency_value)
+        clear(self.positions[_position_hash].borrow_currency_current_value)
+        clear(self.positions[_position_hash].lend_currency_filled_value)
+        clear(self.positions[_position_hash].lend_currency_owed_value)
+        clear(self.positions[_position_hash].nonce)
+        clear(self.positions[_position_hash].relayer_fee)
+        clear(self.positions[_position_hash].monitoring_fee)
+        clear(self.positions[_position_hash].rollover_fee)
+        clear(self.positions[_position_hash].closure_fee)
+
+    return True
+
+
+# external functions
+@public
+def topup_position(_position_hash: bytes32, _borrow_currency_increment: uint256) -> bool:
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    _is_topped_up: bool = self.try_topup_position(msg.sender, _position_hash, _borrow_currency_increment)
+    assert _is_topped_up
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return True
+
+
+@public
+def topup_positions(
+        _position_hashes: bytes32[POSITION_BATCH_SIZE],
+        _borrow_currency_increments: uint256[POSITION_BATCH_SIZE]
+        ) -> bool[POSITION_BATCH_SIZE]:
+    # positions are topped up in order until the first empty hash
+    # a position that fails validation is skipped and reported as False
+    _topped_up: bool[POSITION_BATCH_SIZE]
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    for i in range(POSITION_BATCH_SIZE):
+        if _position_hashes[i] == EMPTY_BYTES32:
+            break
+        _topped_up[i] = self.try_topup_position(msg.sender, _position_hashes[i], _borrow_currency_increments[i])
+
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return _topped_up
+
+
+@public
+def liquidate_position(_position_hash: bytes32) -> bool:
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    _is_liquidated: bool = self.try_settle_position(msg.sender, _position_hash, POSITION_STATUS_LIQUIDATED)
+    assert _is_liquidated
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
 
     return True
 
 
+@public
+def liquidate_positions(_position_hashes: bytes32[POSITION_BATCH_SIZE]) -> bool[POSITION_BATCH_SIZE]:
+    # positions are liquidated in order until the first empty hash
+    # a position that fails validation is skipped and reported as False
+    _liquidated: bool[POSITION_BATCH_SIZE]
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    for i in range(POSITION_BATCH_SIZE):
+        if _position_hashes[i] == EMPTY_BYTES32:
+            break
+        _liquidated[i] = self.try_settle_position(msg.sender, _position_hashes[i], POSITION_STATUS_LIQUIDATED)
+
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return _liquidated
+
+
 @public
 def close_position(_position_hash: bytes32) -> bool:
-    existing_position: Position = self.positions[_position_hash]
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    _is_closed: bool = self.try_settle_position(msg.sender, _position_hash, POSITION_STATUS_CLOSED)
+    assert _is_closed
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return True
+
+
+@public
+def close_positions(_position_hashes: bytes32[POSITION_BATCH_SIZE]) -> bool[POSITION_BATCH_SIZE]:
+    # positions are closed in order until the first empty hash
+    # a position that fails validation is skipped and reported as False
+    _closed: bool[POSITION_BATCH_SIZE]
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    for i in range(POSITION_BATCH_SIZE):
+        if _position_hashes[i] == EMPTY_BYTES32:
+            break
+        _closed[i] = self.try_settle_position(msg.sender, _position_hashes[i], POSITION_STATUS_CLOSED)
+
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return _closed
+
+
+@public
+def rollover_position(_position_hash: bytes32) -> bool:
+    _borrower: address = self.positions[_position_hash].borrower
     # confirm sender is borrower
-    assert msg.sender == existing_position.borrower
+    assert msg.sender == _borrower
+    _packed_state: uint256 = self.positions[_position_hash].packed_state
+    _expires_at: uint256 = shift(_packed_state, -PACKED_EXPIRES_AT_OFFSET)
     # confirm position has not expired yet
-    assert existing_position.expires_at >= block.timestamp
+    assert _expires_at >= as_unitless_number(block.timestamp)
     # confirm position is still active
-    assert existing_position.status == self.POSITION_STATUS_OPEN
-    # lock position_non_reentrant before closure
-    self.lock_position(_position_hash)
-    # perform closure
-    existing_position.status = self.POSITION_STATUS_CLOSED
-    self.positions[_position_hash] = existing_position
-    self.remove_position(_position_hash)
-    # transfer lend_currency_owed_value from borrower to lender
-    token_transfer: bool = ERC20(existing_position.lend_currency_address).transferFrom(
-        existing_position.borrower,
-        existing_position.lender,
-        existing_position.lend_currency_owed_value
-    )
-    assert token_transfer
-    # transfer borrow_currency_current_value from this address to borrower
-    token_transfer = ERC20(existing_position.borrow_currency_address).transfer(
-        existing_position.borrower,
-        existing_position.borrow_currency_current_value
-    )
-    assert token_transfer
-    # Notify wrangler that a position has been closed
-    log.PositionUpdateNotification(existing_position.wrangler, _position_hash, "status", self.POSITION_STATUS_CLOSED)
-    # unlock position_non_reentrant after closure
-    self.unlock_position(_position_hash)
+    assert bitwise_and(_packed_state, PACKED_STATUS_MASK) == POSITION_STATUS_OPEN
+    # the current term started at updated_at, and the next one starts when it ends
+    _term: uint256 = _expires_at - bitwise_and(shift(_packed_state, -PACKED_UPDATED_AT_OFFSET), PACKED_TIMESTAMP_MASK)
+    _duration: uint256 = _expires_at - bitwise_and(shift(_packed_state, -PACKED_CREATED_AT_OFFSET), PACKED_TIMESTAMP_MASK)
+    # a position opened for a zero duration has no term to roll over
+    assert _duration > 0
+    # the next expiry must fit its field in `packed_state`
+    assert _expires_at + _term <= PACKED_TIMESTAMP_MASK
+    # interest accrues evenly over the equally long terms, so the next one adds the interest of a term
+    _lend_currency_owed_value: uint256 = self.positions[_position_hash].lend_currency_owed_value
+    _interest: uint256 = _lend_currency_owed_value - self.positions[_position_hash].lend_currency_filled_value
+    _interest = _interest * _term / _duration
+    self.positions[_position_hash].lend_currency_owed_value = _lend_currency_owed_value + _interest
+    # move updated_at and expires_at forward by a term, adding (2 ** 64 + 1) terms at the updated_at offset
+    self.positions[_position_hash].packed_state = _packed_state + shift(_term * (PACKED_TIMESTAMP_MASK + 2), PACKED_UPDATED_AT_OFFSET)
+    # the rollover takes no lock, as the fee transfer follows every update, but it is not made within a locked call
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    # transfer rollover_fee from borrower to wrangler
+    _wrangler: address = self.positions[_position_hash].wrangler
+    self.transfer_token(self.protocol_token_address, _borrower, _wrangler, self.positions[_position_hash].rollover_fee)
+    # notify wrangler that a position has been rolled over
+    log.PositionUpdateNotification(_wrangler, _borrower, self.positions[_position_hash].lender, _position_hash, POSITION_NOTIFICATION_EXPIRES_AT, _expires_at + _term)
 
     return True
 
@@ -534,78 +896,93 @@ def fill_kernel(
         _position_duration_in_seconds: timedelta,
         # loanDuration
         _kernel_creator_salt: bytes32,
-        _sig_data_kernel_creator: bytes[65],
-        _sig_data_wrangler: bytes[65]
-        # v, r, s of kernel_creator and wrangler
+        _sig_data_kernel_creator: bytes[578],
+        _sig_data_wrangler: bytes[66]
+        # v, r, s of kernel_creator and wrangler, optionally followed by the signature scheme
+        # and, for a kernel_creator signature of a kernel batch, the kernel's Merkle proof
+        # an empty kernel_creator signature fills a kernel registered by its creator
         ) -> bool:
-    # validate _lender is not empty
-    assert _addresses[0] != ZERO_ADDRESS
-    # validate _borrower is not empty
-    assert _addresses[1] != ZERO_ADDRESS
-    _kernel_creator: address = _addresses[1]
-    _kernel: Kernel = Kernel({
-        lender: ZERO_ADDRESS,
-        borrower: _addresses[1],
-        relayer: _addresses[2],
-        wrangler: _addresses[3],
-        borrow_currency_address: _addresses[4],
-        lend_currency_address: _addresses[5],
-        lend_currency_offered_value: _values[1],
-        relayer_fee: _values[2],
-        monitoring_fee: _values[3],
-        rollover_fee: _values[4],
-        closure_fee: _values[5],
-        salt: _kernel_creator_salt,
-        expires_at: _timestamps[0],
-        daily_interest_rate: _kernel_daily_interest_rate,
-        position_duration_in_seconds: _position_duration_in_seconds
-    })
-    if _is_creator_lender:
-        _kernel_creator = _addresses[0]
-        _kernel.lender = _addresses[0]
-        _kernel.borrower = ZERO_ADDRESS
-    # It's OK if _relayer is empty
-    # validate _wrangler is not empty
-    assert _kernel.wrangler != ZERO_ADDRESS
     # validate _collateralToken is a contract address
-    assert self.supported_tokens[_kernel.borrow_currency_address]
+    assert self.supported_tokens[_addresses[4]]
     # validate _loanToken is a contract address
-    assert self.supported_tokens[_kernel.lend_currency_address]
-    # validate loan amounts
-    assert as_unitless_number(_values[0]) > 0
-    assert as_unitless_number(_kernel.lend_currency_offered_value) > 0
-    assert as_unitless_number(_values[6]) > 0
-    # validate asked and offered expiry timestamps
-    assert _kernel.expires_at > block.timestamp
-    # validate daily interest rate on Kernel is greater than 0
-    assert as_unitless_number(_kernel.daily_interest_rate) > 0
-    # compute hash of kernel
-    _k_hash: bytes32 = self.kernel_hash(
-        [_kernel.lender, _kernel.borrower, _kernel.relayer, _kernel.wrangler,
-        _kernel.borrow_currency_address, _kernel.lend_currency_address],
-        [_kernel.lend_currency_offered_value,
-        _kernel.relayer_fee, _kernel.monitoring_fee, _kernel.rollover_fee, _kernel.closure_fee],
-        _kernel.expires_at, _kernel.salt, _kernel.daily_interest_rate, _kernel.position_duration_in_seconds)
-    # validate kernel_creator's signature
-    assert self.is_signer(_kernel_creator, _k_hash, _sig_data_kernel_creator)
-    # validate loan amount to be filled
-    assert as_unitless_number(_kernel.lend_currency_offered_value) - as_unitless_number(self.filled_or_cancelled_loan_amount(_k_hash)) >= as_unitless_number(_values[6])
-    # fill offer with lending currency
-    self.kernels_filled[_k_hash] += _values[6]
-    # open position
-    self.open_position(
-        _kernel_creator, _addresses, _values,
-        _nonce, _kernel_daily_interest_rate,
-        _position_duration_in_seconds, _timestamps[1], _sig_data_wrangler
+    assert self.supported_tokens[_addresses[5]]
+    # validate wrangler's activation status
+    assert self.wranglers[_addresses[3]]
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    _is_filled: bool = self.try_fill_kernel(
+        _addresses, _values, _nonce, _kernel_daily_interest_rate,
+        _is_creator_lender, _timestamps, _position_duration_in_seconds,
+        _kernel_creator_salt, _sig_data_kernel_creator, _sig_data_wrangler,
+        self.protocol_token_address
     )
-    # transfer relayerFeeLST from kernel creator to relayer
-    if (_kernel.relayer != ZERO_ADDRESS) and (as_unitless_number(_kernel.relayer_fee) > 0):
-        token_transfer: bool = ERC20(self.protocol_token_address).transferFrom(
-            _kernel_creator,
-            _kernel.relayer,
-            _kernel.relayer_fee
-        )
-        assert token_transfer
+    assert _is_filled
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return True
+
+
+@public
+def fill_kernels(
+        _addresses: address[6][FILL_KERNELS_BATCH_SIZE],
+        # _addresses: lender, borrower, relayer, wrangler, collateralToken, loanToken
+        _values: uint256[7][FILL_KERNELS_BATCH_SIZE],
+        # _values: collateralAmount, loanAmountOffered, relayerFeeLST, monitoringFeeLST, rolloverFeeLST, closureFeeLST, loanAmountFilled
+        _nonces: uint256[FILL_KERNELS_BATCH_SIZE],
+        _kernel_daily_interest_rates: uint256[FILL_KERNELS_BATCH_SIZE],
+        _is_creator_lender: bool[FILL_KERNELS_BATCH_SIZE],
+        _timestamps: timestamp[2][FILL_KERNELS_BATCH_SIZE],
+        # kernel_expires_at, wrangler_approval_expires_at
+        _position_durations_in_seconds: timedelta[FILL_KERNELS_BATCH_SIZE],
+        # loanDuration
+        _kernel_creator_salts: bytes32[FILL_KERNELS_BATCH_SIZE],
+        _sig_data_kernel_creators: bytes[330],
+        _sig_data_wranglers: bytes[330]
+        # concatenated 66-byte v, r, s and signature scheme of kernel_creators and wranglers
+        ) -> bool[FILL_KERNELS_BATCH_SIZE]:
+    """
+    @dev Fill the entries in order until the first entry with an empty lender. An entry that fails
+         validation is skipped and reported as False. Balances and allowances are not validated, so a
+         token transfer that fails reverts the whole batch, filled entries included.
+    @return whether each entry was filled
+    """
+    _filled: bool[FILL_KERNELS_BATCH_SIZE]
+    assert self.reentrancy_lock == REENTRANCY_UNLOCKED
+    self.reentrancy_lock = REENTRANCY_LOCKED
+    _protocol_token_address: address = self.protocol_token_address
+    # token support and wrangler status are shared by consecutive entries of the same market
+    _wrangler: address = ZERO_ADDRESS
+    _borrow_currency_address: address = ZERO_ADDRESS
+    _lend_currency_address: address = ZERO_ADDRESS
+    _is_market_valid: bool = False
+    for i in range(FILL_KERNELS_BATCH_SIZE):
+        if _addresses[i][0] == ZERO_ADDRESS:
+            break
+        if (_addresses[i][3] != _wrangler) or (_addresses[i][4] != _borrow_currency_address) or (_addresses[i][5] != _lend_currency_address):
+            _wrangler = _addresses[i][3]
+            _borrow_currency_address = _addresses[i][4]
+            _lend_currency_address = _addresses[i][5]
+            _is_market_valid = self.wranglers[_wrangler] and self.supported_tokens[_borrow_currency_address] and self.supported_tokens[_lend_currency_address]
+        if _is_market_valid:
+            _filled[i] = self.try_fill_kernel(
+                _addresses[i], _values[i], _nonces[i], _kernel_daily_interest_rates[i],
+                _is_creator_lender[i], _timestamps[i], _position_durations_in_seconds[i],
+                _kernel_creator_salts[i],
+                slice(_sig_data_kernel_creators, start=66 * i, len=66),
+                slice(_sig_data_wranglers, start=66 * i, len=66),
+                _protocol_token_address
+            )
+
+    self.reentrancy_lock = REENTRANCY_UNLOCKED
+
+    return _filled
+
+
+@public
+def register_kernel(_kernel_hash: bytes32, _is_registered: bool) -> bool:
+    # the sender's kernel with this hash is filled and cancelled without its signature while registered
+    self.kernels_registered[msg.sender][_kernel_hash] = _is_registered
+    log.KernelRegistered(_kernel_hash, msg.sender, _is_registered)
 
     return True
 
@@ -615,39 +992,63 @@ def cancel_kernel(
         _addresses: address[6], _values: uint256[5],
         _kernel_expires: timestamp, _kernel_creator_salt: bytes32,
         _kernel_daily_interest_rate: uint256, _position_duration_in_seconds: timedelta,
-        _sig_data: bytes[65],
+        _sig_data: bytes[578],
         _lend_currency_cancel_value: uint256) -> bool:
     # compute kernel hash from inputs
-    _kernel: Kernel = Kernel({
-        lender: _addresses[0],
-        borrower: _addresses[1],
-        relayer: _addresses[2],
-        wrangler: _addresses[3],
-        borrow_currency_address: _addresses[4],
-        lend_currency_address: _addresses[5],
-        lend_currency_offered_value: _values[0],
-        relayer_fee: _values[1],
-        monitoring_fee: _values[2],
-        rollover_fee: _values[3],
-        closure_fee: _values[4],
-        salt: _kernel_creator_salt,
-        expires_at: _kernel_expires,
-        daily_interest_rate: _kernel_daily_interest_rate,
-        position_duration_in_seconds: _position_duration_in_seconds
-    })
-    _k_hash: bytes32 = self.kernel_hash(
-        [_kernel.lender, _kernel.borrower, _kernel.relayer, _kernel.wrangler,
-        _kernel.borrow_currency_address, _kernel.lend_currency_address],
-        [_kernel.lend_currency_offered_value,
-        _kernel.relayer_fee, _kernel.monitoring_fee, _kernel.rollover_fee, _kernel.closure_fee],
-        _kernel.expires_at, _kernel.salt, _kernel.daily_interest_rate, _kernel.position_duration_in_seconds)
-    # verify sender is kernel creator
-    assert self.is_signer(msg.sender, _k_hash, _sig_data)
+    _k_hash: bytes32 = self.kernel_hash(_addresses, _values, _kernel_expires, _kernel_creator_salt,
+        _kernel_daily_interest_rate, _position_duration_in_seconds)
+    # verify sender is kernel creator, by its signature of the kernel or of its batch, or its registration of the kernel
+    assert self.kernel_signed_hash(msg.sender, _k_hash, _sig_data) != EMPTY_BYTES32
     # verify sanity of offered and cancellation amounts
-    assert as_unitless_number(_kernel.lend_currency_offered_value) > 0
+    assert as_unitless_number(_values[0]) > 0
     assert as_unitless_number(_lend_currency_cancel_value) > 0
     # verify cancellation amount does not exceed remaining loan amount to be filled
-    assert as_unitless_number(_kernel.lend_currency_offered_value) - self.filled_or_cancelled_loan_amount(_k_hash) >= as_unitless_number(_lend_currency_cancel_value)
+    _remaining_value: uint256 = _values[0] - self.filled_or_cancelled_loan_amount(_k_hash)
+    assert as_unitless_number(_remaining_value) >= as_unitless_number(_lend_currency_cancel_value)
     self.kernels_cancelled[_k_hash] += _lend_currency_cancel_value
+    # notify of the cancellation and of the kernel's remaining value
+    log.KernelCancelled(_k_hash, msg.sender, _lend_currency_cancel_value, _remaining_value - _lend_currency_cancel_value)
+
+    return True
+
+
+@public
+def cancel_kernels_up_to(_min_salt: uint256) -> bool:
+    # cancel every kernel of the sender with a salt below _min_salt
+    assert _min_salt > self.kernel_creator_min_salts[msg.sender]
+    self.kernel_creator_min_salts[msg.sender] = _min_salt
+    log.KernelCreatorUpdateNotification(msg.sender, KERNEL_CREATOR_NOTIFICATION_MIN_SALT, _min_salt)
+
+    return True
+
+
+@public
+def deposit(_token_address: address, _value: uint256) -> bool:
+    # fills, topups, closures and fees are paid from deposited balances that suffice
+    self.token_balances[_token_address][msg.sender] += _value
+    self.token_deposits[_token_address] += _value
+    token_transfer: bool = ERC20(_token_address).transferFrom(
+        msg.sender,
+        self,
+        _value
+    )
+    assert token_transfer
+
+    return True
+
+
+@public
+def withdraw(_token_address: address, _value: uint256) -> bool:
+    self.token_balances[_token_address][msg.sender] -= _value
+    self.token_deposits[_token_address] -= _value
+    self.transfer_token(_token_address, self, msg.sender, _value)
+
+    return True
+
+
+@public
+def set_vault_status(_is_active: bool) -> bool:
+    # payments to the sender are credited to its deposited balances, not transferred, when set
+    self.vault_accounts[msg.sender] = _is_active
 
     return True
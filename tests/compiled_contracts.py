@@ -0,0 +1,154 @@
+"""
+On-disk cache of compiled Vyper contracts.
+
+Each artifact holds the ABI and bytecode of a contract, and is stored as
+JSON under a key hashed from the source code, the interface codes it is
+compiled with and the Vyper version. Artifacts compiled for the vdb debugger
+also hold its source map, and their key includes the version of vdb, which
+produces them, so vdb is only imported when debugging. The compiler is only
+imported on a cache miss, so scripts deploying from a warm cache start
+without it.
+
+Warm the cache for deployment scripts with:
+
+    python tests/compiled_contracts.py --interface ERC20=contracts/ERC20.v.py contracts/protocol.v.py
+"""
+import argparse
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+
+from concurrent.futures import (ProcessPoolExecutor,)
+
+import pkg_resources
+
+
+ARTIFACTS_DIR = os.environ.get(
+    'VYPER_ARTIFACTS_DIR',
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'build', 'vyper')
+)
+
+
+@functools.lru_cache()
+def vdb_version():
+    # vdb is installed from its master branch, whose package version does not follow its changes,
+    # so the source map module is hashed along with it, without importing vdb
+    try:
+        version = pkg_resources.get_distribution('vyper-debug').version
+    except pkg_resources.DistributionNotFound:
+        version = pkg_resources.get_distribution('vdb').version
+    package_path = importlib.util.find_spec('vdb').submodule_search_locations[0]
+    with open(os.path.join(package_path, 'source_map.py'), 'rb') as f:
+        return '{0}+{1}'.format(version, hashlib.sha256(f.read()).hexdigest())
+
+
+def artifact_key(source_code, interface_codes=None, source_map=False):
+    key_data = {
+        'vyper_version': pkg_resources.get_distribution('vyper').version,
+        'source_code': source_code,
+        'interface_codes': interface_codes,
+    }
+    if source_map:
+        key_data['vdb_version'] = vdb_version()
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def artifact_path(source_code, interface_codes=None, source_map=False):
+    return os.path.join(ARTIFACTS_DIR, '{0}.json'.format(artifact_key(source_code, interface_codes, source_map)))
+
+
+def _compile(source_code, interface_codes=None, source_map=False):
+    from vyper import compile_code
+
+    kwargs = {} if interface_codes is None else {'interface_codes': interface_codes}
+    compiler_output = compile_code(source_code, ['bytecode', 'abi'], **kwargs)
+    artifact = {
+        'abi': compiler_output['abi'],
+        'bytecode': compiler_output['bytecode'],
+    }
+    if source_map:
+        from vdb.source_map import produce_source_map
+        artifact['source_map'] = produce_source_map(source_code, **kwargs)
+    return artifact
+
+
+def _load(path):
+    with open(path) as f:
+        artifact = json.load(f)
+    if 'source_map' not in artifact:
+        return artifact
+    # JSON turns the program counters into strings, and their source positions into lists
+    line_number_map = artifact['source_map']['line_number_map']
+    line_number_map['pc_pos_map'] = {
+        int(pc): tuple(position) for pc, position in line_number_map['pc_pos_map'].items()
+    }
+    return artifact
+
+
+def _store(path, artifact):
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    # concurrent writers each rename a complete file into place
+    fd, tmp_path = tempfile.mkstemp(dir=ARTIFACTS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(artifact, f)
+    os.replace(tmp_path, path)
+
+
+def compiled_contract(source_code, interface_codes=None, source_map=False):
+    """
+    Returns the artifact of the given source, compiling and storing it on a cache miss.
+    The artifact holds the vdb source map when `source_map` is set.
+    """
+    path = artifact_path(source_code, interface_codes, source_map)
+    if os.path.exists(path):
+        return _load(path)
+    _store(path, _compile(source_code, interface_codes, source_map))
+    return _load(path)
+
+
+def compile_contracts(sources, source_map=False):
+    """
+    Compiles the `(source_code, interface_codes)` pairs missing from the cache in parallel.
+    """
+    missing = [
+        (source_code, interface_codes) for source_code, interface_codes in sources
+        if not os.path.exists(artifact_path(source_code, interface_codes, source_map))
+    ]
+    if len(missing) < 2:
+        for source_code, interface_codes in missing:
+            compiled_contract(source_code, interface_codes, source_map)
+        return
+    with ProcessPoolExecutor(max_workers=min(len(missing), os.cpu_count() or 1)) as executor:
+        list(executor.map(functools.partial(compiled_contract, source_map=source_map), *zip(*missing)))
+
+
+def interface_codes_of(interface_paths):
+    """
+    Returns the Vyper interface codes of the given `{name: path}` contracts.
+    """
+    interface_codes = {}
+    for name, path in interface_paths.items():
+        with open(path) as f:
+            interface_codes[name] = {'type': 'vyper', 'code': f.read()}
+    return interface_codes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile Vyper contracts into the artifacts cache.')
+    parser.add_argument('--interface', action='append', default=[], metavar='NAME=PATH',
+                        help='interface code the contracts are compiled with')
+    parser.add_argument('--source-map', action='store_true', default=False,
+                        help='also produce the vdb source maps of the contracts')
+    parser.add_argument('paths', nargs='+', metavar='PATH')
+    args = parser.parse_args()
+    interface_codes = interface_codes_of(dict(interface.split('=', 1) for interface in args.interface)) or None
+    sources = []
+    for path in args.paths:
+        with open(path) as f:
+            sources.append((f.read(), interface_codes))
+    compile_contracts(sources, args.source_map)
+    for source_code, interface_codes in sources:
+        print(artifact_path(source_code, interface_codes, args.source_map))
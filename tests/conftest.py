@@ -1,10 +1,10 @@
+import functools
 import os
 import random
+import time
 
 import pytest
 
-from vyper import compile_code
-
 from eth_tester import (
     EthereumTester,
     PyEVMBackend,
@@ -20,22 +20,76 @@ from web3 import (
     Web3, EthereumTesterProvider
 )
 
-from vdb.vdb import (
-    VyperDebugCmd
-)
-from vdb.eth_tester_debug_backend import (
-    set_debug_info
+from compiled_contracts import (
+    compile_contracts,
+    compiled_contract,
+    interface_codes_of,
 )
-from vdb.source_map import (
-    produce_source_map
+from gas_report import (
+    DEFAULT_THRESHOLD,
+    is_regression,
+    load_report,
+    store_report,
+    worker_report_path,
 )
 
 
+# constants of the protocol, shared by the test modules
 ZERO_ADDRESS = Web3.toChecksumAddress('0x0000000000000000000000000000000000000000')
+EMPTY_BYTES32 = Web3.toBytes(hexstr='0x{0}'.format('00' * 32))
+FILL_KERNELS_BATCH_SIZE = 5
+POSITION_BATCH_SIZE = 20
+POSITION_STATUS_OPEN = 1
+POSITION_STATUS_CLOSED = 2
+POSITION_STATUS_LIQUIDATED = 3
+SIGNATURE_SCHEME_EIP712 = 1
+SIGNATURE_SCHEME_ETH_SIGN = 2
+# gas used by the entry points at the last accepted change, which the benchmarks must not exceed
+GAS_BASELINE_PATH = 'tests/gas_baseline.json'
+# the protocol is compiled with the ERC20 contract as an interface
+PROTOCOL_INTERFACE_PATHS = {'ERC20': 'contracts/ERC20.v.py'}
+# contracts deployed by the fixtures, with the interfaces they are compiled with
+CONTRACT_PATHS = [
+    ('contracts/ERC20.v.py', {}),
+    ('contracts/protocol.v.py', PROTOCOL_INTERFACE_PATHS),
+    ('contracts/position_reader.v.py', {}),
+    ('tests/contracts/ReentrantERC20.v.py', {}),
+]
+
+
+def pytest_addoption(parser):
+    # vdb stays out of the default runs, which never open a breakpoint
+    parser.addoption('--vdb', action='store_true', default=False, help='enable the vdb debugger for deployed contracts')
+    parser.addoption('--gas-report', default=None, metavar='PATH', help='write the gas used by the benchmarks to PATH')
+    parser.addoption('--gas-baseline', default=GAS_BASELINE_PATH, metavar='PATH',
+                     help='fail benchmarks using more gas than in the PATH report, none if empty (default: %(default)s)')
+    parser.addoption('--gas-threshold', type=float, default=DEFAULT_THRESHOLD, metavar='PERCENT',
+                     help='gas increase allowed over the baseline, in percent')
+
+
+def repository_path(path):
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, path)
+
+
+def repository_interface_codes(interface_paths):
+    return interface_codes_of({name: repository_path(path) for name, path in interface_paths.items()}) or None
+
+
+def contract_source(path, interface_paths):
+    with open(repository_path(path)) as f:
+        return f.read(), repository_interface_codes(interface_paths)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def compiled_contracts(request):
+    # a cold cache compiles the contracts in parallel, ahead of the first deployment
+    compile_contracts(
+        [contract_source(path, interface_paths) for path, interface_paths in CONTRACT_PATHS],
+        source_map=request.config.getoption('vdb')
+    )
 
 
-@pytest.fixture
-def tester():
+def _tester():
     genesis_overrides = {"gas_limit": 7000000}
     custom_genesis_params = PyEVMBackend._generate_genesis_params(
         overrides=genesis_overrides
@@ -49,48 +103,89 @@ def zero_gas_price_strategy(web3, transaction_params=None):
     return 0  # zero gas price makes testing simpler.
 
 
-@pytest.fixture()
-def w3(tester):
+def chain_timestamp(w3):
+    """
+    Returns the earliest timestamp of the next block. Blocks mined after a snapshot is
+    restored are stamped with the wall clock time, however old the restored block is.
+    """
+    return max(w3.eth.getBlock('latest').timestamp, int(time.time()))
+
+
+def local_account(tester, name):
+    # accounts are derived from their name, so every run and worker signs with the same keys
+    account = Account.privateKeyToAccount(Web3.sha3(text=name))
+    # the tester only simulates calls from the accounts it holds the keys of
+    tester.add_account(Web3.toHex(account.privateKey))
+    return account
+
+
+def _w3(tester):
     w3 = Web3(EthereumTesterProvider(ethereum_tester=tester))
     w3.eth.setGasPriceStrategy(zero_gas_price_strategy)
     w3.eth.defaultAccount = w3.eth.accounts[0]
-    w3.eth.lenderAccount = Account.create('lender')
+    w3.eth.lenderAccount = local_account(tester, 'lender')
     w3.eth.sendTransaction({'to': w3.eth.lenderAccount.address, 'from': w3.eth.accounts[1], 'value': 1000000*10**18})
-    w3.eth.borrowerAccount = Account.create('borrower')
+    w3.eth.borrowerAccount = local_account(tester, 'borrower')
     w3.eth.sendTransaction({'to': w3.eth.borrowerAccount.address, 'from': w3.eth.accounts[2], 'value': 1000000*10**18})
-    w3.eth.relayerAccount = Account.create('relayer')
+    w3.eth.relayerAccount = local_account(tester, 'relayer')
     w3.eth.sendTransaction({'to': w3.eth.relayerAccount.address, 'from': w3.eth.accounts[3], 'value': 1000000*10**18})
-    w3.eth.wranglerAccount = Account.create('relayer')
+    w3.eth.wranglerAccount = local_account(tester, 'wrangler')
     w3.eth.sendTransaction({'to': w3.eth.wranglerAccount.address, 'from': w3.eth.accounts[4], 'value': 1000000*10**18})
     w3.eth.maliciousUserAccount = w3.eth.accounts[7]
     return w3
 
 
+@pytest.fixture(scope='session')
+def world(request, compiled_contracts):
+    """
+    Funds the accounts and deploys the tokens and the protocol once per session.
+    Each test starts from the snapshot taken right after, see `tester`.
+    """
+    tester = _tester()
+    w3 = _w3(tester)
+    get_contract = functools.partial(_get_contract, w3, debug=request.config.getoption('vdb'))
+    world = {'tester': tester, 'w3': w3}
+    for name, constructor_args in [
+        ('LST_token', ['Lendroid Support Token', 'LST', 18, 12000000000]),
+        ('Lend_token', ['Test Lend Token', 'TLT', 18, 10000000000]),
+        ('Borrow_token', ['Test Borrow Token', 'TBT', 18, 10000000000]),
+    ]:
+        world[name] = create_contract(w3, get_contract, 'contracts/ERC20.v.py', constructor_args)
+    world['Protocol'] = create_contract(
+        w3, get_contract, 'contracts/protocol.v.py', [world['LST_token'].address],
+        interface_codes=repository_interface_codes(PROTOCOL_INTERFACE_PATHS)
+    )
+    world['block_number'] = w3.eth.blockNumber
+    world['snapshot_id'] = tester.take_snapshot()
+    return world
+
+
+@pytest.fixture
+def tester(world):
+    world['tester'].revert_to_snapshot(world['snapshot_id'])
+    return world['tester']
+
+
+@pytest.fixture()
+def w3(world, tester):
+    return world['w3']
+
+
 def _get_contract(w3, source_code, *args, **kwargs):
+    debug = kwargs.pop('debug', False)
     interface_codes = kwargs.get('interface_codes')
-
-    if interface_codes == None:
-        compiler_output = compile_code(
-            source_code,
-            ['bytecode', 'abi'],
-        )
-        source_map = produce_source_map(source_code)
-    else:
-        compiler_output = compile_code(
-            source_code,
-            ['bytecode', 'abi'],
-            interface_codes=interface_codes,
-        )
-        source_map = produce_source_map(source_code, interface_codes=interface_codes)
+    compiler_output = compiled_contract(source_code, interface_codes, source_map=debug)
 
     abi = compiler_output['abi']
     bytecode = compiler_output['bytecode']
     contract = w3.eth.contract(abi=abi, bytecode=bytecode)
 
-    # Enable vdb.
-    set_debug_info(source_code, source_map)
-    import vdb
-    setattr(vdb.debug_computation.DebugComputation, 'enable_debug', True)
+    if debug:
+        # Enable vdb.
+        from vdb.eth_tester_debug_backend import set_debug_info
+        set_debug_info(source_code, compiler_output['source_map'])
+        import vdb
+        setattr(vdb.debug_computation.DebugComputation, 'enable_debug', True)
     constructor_args = kwargs.get('constructor_args', [])
     value = kwargs.pop('value', 0)
     value_in_eth = kwargs.pop('value_in_eth', 0)
@@ -106,7 +201,8 @@ def _get_contract(w3, source_code, *args, **kwargs):
     tx = w3.eth.sendTransaction(deploy_transaction)
     tx_receipt = w3.eth.getTransactionReceipt(tx)
     if tx_receipt['status'] == 0:
-        import ipdb; ipdb.set_trace()
+        if debug:
+            import ipdb; ipdb.set_trace()
         raise Exception('Could not deploy contract! {}'.format(tx_receipt))
     address = tx_receipt['contractAddress']
     contract = w3.eth.contract(address, abi=abi, bytecode=bytecode)
@@ -120,12 +216,19 @@ def _get_contract(w3, source_code, *args, **kwargs):
 
 def _transact_as_local_account(w3, local_account, transaction_function, gas=70000):
     transaction_params = transaction_function.buildTransaction({
-        'gas': 70000,
+        'gas': gas,
         'gasPrice': w3.toWei('1', 'gwei'),
         'nonce': w3.eth.getTransactionCount(local_account.address),
     })
     raw_tx = local_account.signTransaction(transaction_params).rawTransaction
-    w3.eth.sendRawTransaction(raw_tx)
+    return w3.eth.sendRawTransaction(raw_tx)
+
+
+@pytest.fixture
+def transact_as_local_account(w3):
+    def transact_as_local_account(local_account, transaction_function, gas=70000):
+        return _transact_as_local_account(w3, local_account, transaction_function, gas=gas)
+    return transact_as_local_account
 
 
 @pytest.fixture
@@ -138,19 +241,55 @@ def get_logs(w3):
 
 
 @pytest.fixture
-def get_contract(w3):
+def get_contract(w3, request):
     def get_contract(source_code, *args, **kwargs):
+        kwargs.setdefault('debug', request.config.getoption('vdb'))
         return _get_contract(w3, source_code, *args, **kwargs)
     return get_contract
 
 
 def create_contract(w3, get_contract, path, constructor_args, interface_codes=None, **kwargs):
-    wd = os.path.dirname(os.path.realpath(__file__))
-    with open(os.path.join(wd, os.pardir, path)) as f:
+    with open(repository_path(path)) as f:
         source_code = f.read()
     return get_contract(source_code, constructor_args=constructor_args, interface_codes=interface_codes, **kwargs)
 
 
+@pytest.fixture(scope='session')
+def gas_report(request):
+    """
+    Collects the gas used by the benchmarks, and writes it to the `--gas-report` path.
+    """
+    report = {}
+    yield report
+    path = request.config.getoption('gas_report')
+    if path and report:
+        store_report(worker_report_path(path, os.environ.get('PYTEST_XDIST_WORKER')), report)
+
+
+@pytest.fixture(scope='session')
+def gas_baseline(request):
+    path = request.config.getoption('gas_baseline')
+    return load_report(repository_path(path)) if path else {}
+
+
+@pytest.fixture
+def record_gas(w3, request, gas_report, gas_baseline):
+    def record_gas(key, tx_hash):
+        """
+        Records the gas used by a successful transaction under `key`, and fails
+        when it exceeds the baseline's by more than `--gas-threshold` percent.
+        """
+        tx_receipt = w3.eth.getTransactionReceipt(tx_hash)
+        assert tx_receipt['status'] == 1
+        gas_used = tx_receipt['gasUsed']
+        gas_report[key] = gas_used
+        baseline_gas = gas_baseline.get(key)
+        assert not is_regression(baseline_gas, gas_used, request.config.getoption('gas_threshold')), \
+            '{0} used {1} gas, {2} in the baseline'.format(key, gas_used, baseline_gas)
+        return gas_used
+    return record_gas
+
+
 @pytest.fixture
 def assert_tx_failed(tester):
     def assert_tx_failed(function_to_test, exception=TransactionFailed):
@@ -162,33 +301,29 @@ def assert_tx_failed(tester):
 
 
 @pytest.fixture
-def LST_token(w3, get_contract):
-    return create_contract(
-        w3=w3,
-        get_contract=get_contract,
-        path='contracts/ERC20.v.py',
-        constructor_args=['Lendroid Support Token', 'LST', 18, 12000000000]
-    )
+def assert_local_tx_failed(w3):
+    def assert_local_tx_failed(local_account, transaction_function, gas=70000):
+        """
+        Sends a transaction signed by a local account, and asserts that it reverted.
+        """
+        tx_hash = _transact_as_local_account(w3, local_account, transaction_function, gas=gas)
+        assert w3.eth.getTransactionReceipt(tx_hash)['status'] == 0
+    return assert_local_tx_failed
 
 
 @pytest.fixture
-def Lend_token(w3, get_contract):
-    return create_contract(
-        w3=w3,
-        get_contract=get_contract,
-        path='contracts/ERC20.v.py',
-        constructor_args=['Test Lend Token', 'TLT', 18, 10000000000]
-    )
+def LST_token(world, w3):
+    return world['LST_token']
 
 
 @pytest.fixture
-def Borrow_token(w3, get_contract):
-    return create_contract(
-        w3=w3,
-        get_contract=get_contract,
-        path='contracts/ERC20.v.py',
-        constructor_args=['Test Borrow Token', 'TBT', 18, 10000000000]
-    )
+def Lend_token(world, w3):
+    return world['Lend_token']
+
+
+@pytest.fixture
+def Borrow_token(world, w3):
+    return world['Borrow_token']
 
 
 @pytest.fixture
@@ -203,29 +338,26 @@ def Malicious_token(w3, get_contract):
 
 
 @pytest.fixture
-def Protocol(w3, get_contract, LST_token):
-    wd = os.path.dirname(os.path.realpath(__file__))
-    with open(os.path.join(wd, os.pardir, 'contracts/ERC20.v.py')) as f:
-        interface_codes = {
-            'ERC20': {
-                'type': 'vyper',
-                'code': f.read()
-            }
-        }
+def Protocol(world, w3, LST_token):
+    return world['Protocol']
+
+
+@pytest.fixture
+def Position_reader(w3, get_contract, Protocol):
     return create_contract(
         w3=w3,
         get_contract=get_contract,
-        path='contracts/protocol.v.py',
-        constructor_args=[LST_token.address],
-        interface_codes=interface_codes
+        path='contracts/position_reader.v.py',
+        constructor_args=[Protocol.address]
     )
 
 
 @pytest.fixture
-def random_salt(**kwargs):
+def random_salt(request, **kwargs):
     string_size = kwargs.pop('string_size', 32)
     assert isinstance(string_size, int)
-    ran = random.randrange(10**80)
+    # salts are seeded by the test, so they do not depend on the worker or the order of the tests
+    ran = random.Random(request.node.nodeid).randrange(10**80)
     myhex = "%064x" % ran
     #limit string to `string_size` characters
     myhex = myhex[:string_size]
@@ -255,7 +387,7 @@ def Position(w3, Protocol, LST_token, Lend_token, Borrow_token, random_salt):
     kernel_monitoring_fee = Web3.toWei('10', 'ether')
     kernel_rollover_fee = Web3.toWei('10', 'ether')
     kernel_closure_fee = Web3.toWei('10', 'ether')
-    kernel_expires_at = w3.eth.getBlock('latest').timestamp + 86400*2
+    kernel_expires_at = chain_timestamp(w3) + 86400*2
     kernel_creator_salt = '0x{0}'.format(random_salt)
     position_lending_currency_fill_value = Web3.toWei('10', 'ether')
     position_borrow_currency_fill_value = Web3.toWei('1.1', 'ether')
@@ -309,7 +441,7 @@ def Position(w3, Protocol, LST_token, Lend_token, Borrow_token, random_salt):
     _signature = w3.eth.account.signHash(position_hash, private_key=w3.eth.wranglerAccount.privateKey)
     wrangler_signature = _signature.signature
     # prepare inputs for kernel fill
-    wrangler_approval_expiry_timestamp = w3.eth.getBlock('latest').timestamp + wrangler_approval_duration_in_seconds
+    wrangler_approval_expiry_timestamp = chain_timestamp(w3) + wrangler_approval_duration_in_seconds
     # fill kernel
     Protocol.functions.fill_kernel(
       [
@@ -331,3 +463,186 @@ def Position(w3, Protocol, LST_token, Lend_token, Borrow_token, random_salt):
       kernel_creator_signature,
       wrangler_signature
     ).transact({'from': w3.eth.defaultAccount})
+
+
+@pytest.fixture
+def sign_hash(w3):
+    def sign_hash(_hash, local_account, signature_scheme=None):
+        """
+        Signs a protocol hash. Without a signature scheme, returns the 65-byte
+        eth_sign signature. With a scheme, appends the scheme selector byte.
+        """
+        if signature_scheme != SIGNATURE_SCHEME_EIP712:
+            _hash = Web3.soliditySha3(['bytes32', 'bytes32'], [Web3.toBytes(text='\x19Ethereum Signed Message:\n32'), _hash])
+        signature = w3.eth.account.signHash(_hash, private_key=local_account.privateKey).signature
+        if signature_scheme is None:
+            return signature
+        return bytes(signature) + bytes([signature_scheme])
+    return sign_hash
+
+
+@pytest.fixture
+def Market(w3, world, tester, Protocol, LST_token, Lend_token, Borrow_token):
+    # the market of the session's contracts is set up once, then restored from its snapshot
+    is_session_market = w3.eth.blockNumber == world['block_number']
+    if is_session_market and 'market_snapshot_id' in world:
+        tester.revert_to_snapshot(world['market_snapshot_id'])
+        return
+    Protocol.functions.set_token_support(Lend_token.address, True).transact({'from': w3.eth.defaultAccount})
+    Protocol.functions.set_token_support(Borrow_token.address, True).transact({'from': w3.eth.defaultAccount})
+    Protocol.functions.set_wrangler_status(w3.eth.wranglerAccount.address, True).transact({'from': w3.eth.defaultAccount})
+    Protocol.functions.set_position_threshold(20).transact({'from': w3.eth.defaultAccount})
+    # set LST approval
+    LST_token.functions.mint(w3.eth.lenderAccount.address, Web3.toWei('100', 'ether')).transact({'from': w3.eth.defaultAccount})
+    _transact_as_local_account(w3, w3.eth.lenderAccount, LST_token.functions.approve(Protocol.address, Web3.toWei('100', 'ether')))
+    # set Lend token approval
+    Lend_token.functions.mint(w3.eth.lenderAccount.address, Web3.toWei('100', 'ether')).transact({'from': w3.eth.defaultAccount})
+    _transact_as_local_account(w3, w3.eth.lenderAccount, Lend_token.functions.approve(Protocol.address, Web3.toWei('100', 'ether')))
+    # set Borrow token approval
+    Borrow_token.functions.mint(w3.eth.borrowerAccount.address, Web3.toWei('100', 'ether')).transact({'from': w3.eth.defaultAccount})
+    _transact_as_local_account(w3, w3.eth.borrowerAccount, Borrow_token.functions.approve(Protocol.address, Web3.toWei('100', 'ether')))
+    # set Lend token approval for loan repayment
+    Lend_token.functions.mint(w3.eth.borrowerAccount.address, Web3.toWei('100', 'ether')).transact({'from': w3.eth.defaultAccount})
+    _transact_as_local_account(w3, w3.eth.borrowerAccount, Lend_token.functions.approve(Protocol.address, Web3.toWei('100', 'ether')))
+    if is_session_market:
+        world['market_snapshot_id'] = tester.take_snapshot()
+
+
+@pytest.fixture
+def kernel_fill(w3, Protocol, Lend_token, Borrow_token, sign_hash):
+    # expiries of the kernels filled by the test, by salt
+    kernel_expiries = {}
+
+    def kernel_fill(kernel_creator_salt, nonce, signature_scheme=None, lend_currency_fill_value=None, kernel_expires_at=None,
+                    relayer_address=None, position_duration_in_seconds=None):
+        """
+        Returns the `fill_kernel` arguments for a 1 ether fill of a lender kernel,
+        with the position approved by the wrangler under the given nonce.
+        Fills of the same kernel share its salt, and the expiry given to its first fill.
+        The kernel is relayed by the relayer account, unless given another relayer address,
+        and its positions last 90 days, unless given another duration.
+        """
+        if relayer_address is None:
+            relayer_address = w3.eth.relayerAccount.address
+        kernel_daily_interest_rate = Web3.toWei('0.000001', 'ether')
+        kernel_position_duration_in_seconds = 90 * 60 * 60 * 24 if position_duration_in_seconds is None else position_duration_in_seconds
+        kernel_lending_currency_maximum_value = Web3.toWei('40', 'ether')
+        kernel_fees = [Web3.toWei('1', 'ether')] * 4
+        if kernel_expires_at is None:
+            kernel_expires_at = kernel_expiries.get(kernel_creator_salt, chain_timestamp(w3) + 86400*2)
+        kernel_expiries.setdefault(kernel_creator_salt, kernel_expires_at)
+        position_lending_currency_fill_value = lend_currency_fill_value or Web3.toWei('1', 'ether')
+        position_borrow_currency_fill_value = Web3.toWei('0.1', 'ether')
+        position_lending_currency_owed_value = Protocol.functions.owed_value(
+          position_lending_currency_fill_value,
+          kernel_daily_interest_rate,
+          kernel_position_duration_in_seconds
+        ).call()
+        kernel_hash = Protocol.functions.kernel_hash(
+          [
+            w3.eth.lenderAccount.address, ZERO_ADDRESS, relayer_address, w3.eth.wranglerAccount.address, Borrow_token.address, Lend_token.address
+          ],
+          [kernel_lending_currency_maximum_value] + kernel_fees,
+          kernel_expires_at, kernel_creator_salt,
+          kernel_daily_interest_rate, kernel_position_duration_in_seconds
+        ).call()
+        values = [position_borrow_currency_fill_value, kernel_lending_currency_maximum_value] + kernel_fees + [position_lending_currency_fill_value]
+        position_hash = Protocol.functions.position_hash(
+          [
+            w3.eth.lenderAccount.address, w3.eth.lenderAccount.address, w3.eth.borrowerAccount.address, relayer_address, w3.eth.wranglerAccount.address, Borrow_token.address, Lend_token.address
+          ],
+          values,
+          position_lending_currency_owed_value,
+          nonce
+        ).call()
+        return (
+          [
+            w3.eth.lenderAccount.address, w3.eth.borrowerAccount.address, relayer_address, w3.eth.wranglerAccount.address, Borrow_token.address, Lend_token.address
+          ],
+          values,
+          nonce,
+          kernel_daily_interest_rate,
+          True,
+          [
+            kernel_expires_at, chain_timestamp(w3) + 5 * 60
+          ],
+          kernel_position_duration_in_seconds,
+          kernel_creator_salt,
+          sign_hash(kernel_hash, w3.eth.lenderAccount, signature_scheme),
+          sign_hash(position_hash, w3.eth.wranglerAccount, signature_scheme)
+        )
+    return kernel_fill
+
+
+@pytest.fixture
+def fill_kernel(w3, Protocol):
+    def fill_kernel(fill):
+        return Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+    return fill_kernel
+
+
+@pytest.fixture
+def fill_kernels_args():
+    def fill_kernels_args(fills):
+        """
+        Transposes a list of `fill_kernel` arguments into `fill_kernels` arguments,
+        padded with empty entries up to the batch size. Signatures without a scheme
+        selector are given the legacy one.
+        """
+        padding = FILL_KERNELS_BATCH_SIZE - len(fills)
+        return (
+          [f[0] for f in fills] + [[ZERO_ADDRESS] * 6] * padding,
+          [f[1] for f in fills] + [[0] * 7] * padding,
+          [f[2] for f in fills] + [0] * padding,
+          [f[3] for f in fills] + [0] * padding,
+          [f[4] for f in fills] + [False] * padding,
+          [f[5] for f in fills] + [[0, 0]] * padding,
+          [f[6] for f in fills] + [0] * padding,
+          [f[7] for f in fills] + [EMPTY_BYTES32] * padding,
+          b''.join(bytes(f[8]).ljust(66, b'\x00') for f in fills),
+          b''.join(bytes(f[9]).ljust(66, b'\x00') for f in fills)
+        )
+    return fill_kernels_args
+
+
+@pytest.fixture
+def open_positions(Protocol, kernel_fill, fill_kernel):
+    def open_positions(kernel_creator_salt, nonces):
+        """
+        Fills the kernel with the given salt under each nonce, and returns the
+        hashes of the opened positions.
+        """
+        first_position_index = Protocol.functions.last_position_index().call()
+        for nonce in nonces:
+            fill_kernel(kernel_fill(kernel_creator_salt, nonce))
+        return [Protocol.functions.position_index(index).call() for index in range(first_position_index, first_position_index + len(nonces))]
+    return open_positions
+
+
+@pytest.fixture
+def expire_position(tester, Protocol):
+    def expire_position(position_hash):
+        tester.time_travel(Protocol.functions.position(position_hash).call()[8] + 1)
+        tester.mine_blocks()
+    return expire_position
+
+
+@pytest.fixture
+def cancel_kernel_args():
+    def cancel_kernel_args(fill, lend_currency_cancel_value):
+        """
+        Returns the `cancel_kernel` arguments of the kernel of the given `fill_kernel` arguments.
+        """
+        addresses, values, nonce, daily_interest_rate, is_creator_lender, timestamps, duration, salt, kernel_signature, position_signature = fill
+        # the kernel creator signs the kernel with an empty counterparty
+        addresses = list(addresses)
+        addresses[1 if is_creator_lender else 0] = ZERO_ADDRESS
+        return (addresses, values[1:6], timestamps[0], salt, daily_interest_rate, duration, kernel_signature, lend_currency_cancel_value)
+    return cancel_kernel_args
+
+
+@pytest.fixture
+def kernel_hash_of(Protocol, cancel_kernel_args):
+    def kernel_hash_of(fill):
+        return Protocol.functions.kernel_hash(*cancel_kernel_args(fill, 0)[:6]).call()
+    return kernel_hash_of
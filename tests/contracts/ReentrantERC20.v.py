@@ -0,0 +1,76 @@
+# @dev ERC-20 token that calls back into a contract from its transfers,
+#      to test the protocol against reentrant tokens.
+
+Transfer: event({_from: indexed(address), _to: indexed(address), _value: uint256})
+Approval: event({_owner: indexed(address), _spender: indexed(address), _value: uint256})
+
+balances: map(address, uint256)
+allowances: map(address, map(address, uint256))
+minter: address
+# call made from within the next transfer
+reentry_target: address
+reentry_data: bytes[2048]
+
+
+@public
+def __init__():
+    self.minter = msg.sender
+
+
+@public
+@constant
+def balanceOf(_owner: address) -> uint256:
+    return self.balances[_owner]
+
+
+@public
+@constant
+def allowance(_owner: address, _spender: address) -> uint256:
+    return self.allowances[_owner][_spender]
+
+
+@public
+def set_reentry(_target: address, _data: bytes[2048]):
+    """
+    @dev Sets the call made from within the next transfer, which reverts the transfer if it fails.
+    """
+    self.reentry_target = _target
+    self.reentry_data = _data
+
+
+@private
+def _transfer(_from: address, _to: address, _value: uint256):
+    self.balances[_from] -= _value
+    self.balances[_to] += _value
+    log.Transfer(_from, _to, _value)
+    if self.reentry_target != ZERO_ADDRESS:
+        _target: address = self.reentry_target
+        self.reentry_target = ZERO_ADDRESS
+        _response: bytes[32] = raw_call(_target, self.reentry_data, outsize=32, gas=msg.gas)
+
+
+@public
+def transfer(_to: address, _value: uint256) -> bool:
+    self._transfer(msg.sender, _to, _value)
+    return True
+
+
+@public
+def approve(_spender: address, _value: uint256) -> bool:
+    self.allowances[msg.sender][_spender] = _value
+    log.Approval(msg.sender, _spender, _value)
+    return True
+
+
+@public
+def transferFrom(_from: address, _to: address, _value: uint256) -> bool:
+    self.allowances[_from][msg.sender] -= _value
+    self._transfer(_from, _to, _value)
+    return True
+
+
+@public
+def mint(_to: address, _value: uint256):
+    assert msg.sender == self.minter
+    self.balances[_to] += _value
+    log.Transfer(ZERO_ADDRESS, _to, _value)
@@ -0,0 +1,87 @@
+"""
+Gas used by the protocol entry points across benchmark scenarios.
+
+A report maps `entry_point/scenario` keys to the gas used by their
+transaction, and is stored as JSON. The benchmarks write one with
+`pytest --gas-report build/gas/report.json`, and fail on regressions
+against the committed `tests/gas_baseline.json`, or the report given with
+`--gas-baseline`. Under pytest-xdist each worker writes its own report,
+suffixed with the worker id.
+
+Compare reports against the baseline with:
+
+    python tests/gas_report.py tests/gas_baseline.json build/gas/report.gw0.json build/gas/report.gw1.json --threshold 1
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+
+DEFAULT_THRESHOLD = 1.0
+
+
+def worker_report_path(path, worker_id=None):
+    """
+    Returns the report path of the given pytest-xdist worker, or `path` outside of xdist.
+    """
+    if worker_id is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return '{0}.{1}{2}'.format(root, worker_id, ext)
+
+
+def load_report(*paths):
+    """
+    Returns the entries of the given reports, merged.
+    """
+    report = {}
+    for path in paths:
+        with open(path) as f:
+            report.update(json.load(f))
+    return report
+
+
+def store_report(path, report):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_regression(baseline_gas, gas_used, threshold=DEFAULT_THRESHOLD):
+    # `threshold` is the increase allowed over the baseline, in percent
+    if baseline_gas is None:
+        return False
+    return gas_used * 100 > baseline_gas * (100 + threshold)
+
+
+def regressions(baseline, report, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns the `(key, baseline_gas, gas_used)` of the report entries using more
+    than `threshold` percent more gas than in the baseline.
+    """
+    return [
+        (key, baseline[key], gas_used) for key, gas_used in sorted(report.items())
+        if is_regression(baseline.get(key), gas_used, threshold)
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare gas reports against a baseline.')
+    parser.add_argument('baseline', metavar='BASELINE')
+    parser.add_argument('reports', nargs='+', metavar='REPORT')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='increase allowed over the baseline, in percent')
+    args = parser.parse_args()
+    baseline = load_report(args.baseline)
+    report = load_report(*args.reports)
+    for key, gas_used in sorted(report.items()):
+        baseline_gas = baseline.get(key)
+        change = '' if baseline_gas is None else '{0:+d}'.format(gas_used - baseline_gas)
+        print('{0:<48} {1:>10} {2:>10}'.format(key, gas_used, change))
+    if regressions(baseline, report, args.threshold):
+        sys.exit(1)
@@ -0,0 +1,61 @@
+"""
+Helpers for signing a batch of kernels with a single signature.
+
+The kernel creator signs the Merkle root of the batch's kernel hashes.
+Each kernel is then filled with that signature followed by the kernel's
+Merkle proof, as `fill_kernel` expects.
+"""
+from web3 import (Web3,)
+
+
+SIGNATURE_SCHEME_LEGACY = 0
+
+
+def merkle_parent(left, right):
+    # the contract hashes each pair of nodes in ascending order
+    return Web3.sha3(b''.join(sorted([bytes(left), bytes(right)])))
+
+
+def merkle_tree(leaves):
+    """
+    Returns the levels of the Merkle tree over the given kernel hashes,
+    from the leaves up to the root. A node without a sibling moves up
+    a level unchanged.
+    """
+    assert len(leaves) > 0
+    levels = [[bytes(leaf) for leaf in leaves]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([
+            merkle_parent(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ])
+    return levels
+
+
+def merkle_root(tree):
+    return tree[-1][0]
+
+
+def merkle_proof(tree, index):
+    """
+    Returns the sibling hashes from the leaf at the given index up to the root.
+    """
+    proof = []
+    for level in tree[:-1]:
+        sibling_index = index ^ 1
+        if sibling_index < len(level):
+            proof.append(level[sibling_index])
+        index //= 2
+    return proof
+
+
+def batch_signature(root_signature, proof):
+    """
+    Returns the kernel creator signature of a kernel in a batch: the signature
+    of the batch root, its signature scheme, and the kernel's Merkle proof.
+    """
+    root_signature = bytes(root_signature)
+    if len(root_signature) == 65:
+        root_signature += bytes([SIGNATURE_SCHEME_LEGACY])
+    return root_signature + b''.join(proof)
@@ -0,0 +1,42 @@
+from web3 import (Web3,)
+
+from conftest import (chain_timestamp,)
+
+
+def test_cancel_kernel_should_be_callable_only_by_creator(w3, Protocol, Market, kernel_fill, cancel_kernel_args, kernel_hash_of, transact_as_local_account, assert_local_tx_failed, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    cancel_kernel = Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('10', 'ether')))
+    for account in [w3.eth.borrowerAccount, w3.eth.relayerAccount, w3.eth.wranglerAccount]:
+        assert_local_tx_failed(account, cancel_kernel, gas=1000000)
+        assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == 0
+    transact_as_local_account(w3.eth.lenderAccount, cancel_kernel, gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == Web3.toWei('10', 'ether')
+
+
+def test_cancel_kernel_should_not_work_if_cancel_value_exceeds_the_maximum_value(w3, Protocol, Market, kernel_fill, cancel_kernel_args, kernel_hash_of, assert_local_tx_failed, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    assert_local_tx_failed(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('41', 'ether'))), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == 0
+
+
+def test_cancel_kernel_should_work_for_the_same_kernel_parameters_except_the_creator_salt(w3, Protocol, Market, kernel_fill, cancel_kernel_args, kernel_hash_of, transact_as_local_account, random_salt):
+    kernel_expires_at = chain_timestamp(w3) + 86400*2
+    fills = [kernel_fill('0x{0}'.format(salt), 1, kernel_expires_at=kernel_expires_at) for salt in [random_salt, random_salt[::-1]]]
+    for fill in fills:
+        transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('40', 'ether'))), gas=1000000)
+        assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == Web3.toWei('40', 'ether')
+
+
+def test_cancel_kernel_should_work_up_to_the_maximum_value_minus_the_filled_value(w3, Protocol, Market, kernel_fill, fill_kernel, cancel_kernel_args, kernel_hash_of, transact_as_local_account, assert_local_tx_failed, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1, lend_currency_fill_value=Web3.toWei('30', 'ether'))
+    fill_kernel(fill)
+    # cancel_value > maximum value - filled value
+    assert_local_tx_failed(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('11', 'ether'))), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == 0
+    # cancel_value < maximum value - filled value
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('4', 'ether'))), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == Web3.toWei('4', 'ether')
+    # cancel_value = maximum value - filled value
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('6', 'ether'))), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash_of(fill)).call() == Web3.toWei('10', 'ether')
+    assert Protocol.functions.filled_or_cancelled_loan_amount(kernel_hash_of(fill)).call() == Web3.toWei('40', 'ether')
@@ -0,0 +1,33 @@
+def salt(value):
+    return '0x{0:064x}'.format(value)
+
+
+def test_cancel_kernels_up_to_cancels_kernels_below_the_min_salt(w3, Protocol, Market, kernel_fill, transact_as_local_account, assert_tx_failed):
+    Protocol.functions.fill_kernel(*kernel_fill(salt(5), 1)).transact({'from': w3.eth.defaultAccount})
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(10))
+    assert Protocol.functions.kernel_creator_min_salts(w3.eth.lenderAccount.address).call() == 10
+    # kernels with a salt below the min salt can no longer be filled
+    for kernel_salt in [5, 9]:
+        assert_tx_failed(lambda: Protocol.functions.fill_kernel(*kernel_fill(salt(kernel_salt), 2)).transact({'from': w3.eth.defaultAccount}))
+    # kernels with a salt from the min salt can
+    Protocol.functions.fill_kernel(*kernel_fill(salt(10), 2)).transact({'from': w3.eth.defaultAccount})
+    Protocol.functions.fill_kernel(*kernel_fill(salt(2 ** 200), 3)).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 3
+
+
+def test_cancel_kernels_up_to_only_increases_the_min_salt(w3, Protocol, transact_as_local_account, assert_local_tx_failed):
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(10))
+    assert_local_tx_failed(w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(10))
+    assert_local_tx_failed(w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(3))
+    assert Protocol.functions.kernel_creator_min_salts(w3.eth.lenderAccount.address).call() == 10
+    # other creators are not affected
+    assert Protocol.functions.kernel_creator_min_salts(w3.eth.borrowerAccount.address).call() == 0
+
+
+def test_cancel_kernels_up_to_logs_the_min_salt(w3, Protocol):
+    tx_hash = Protocol.functions.cancel_kernels_up_to(42).transact({'from': w3.eth.defaultAccount})
+    logs = Protocol.events.KernelCreatorUpdateNotification().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+    assert len(logs) == 1
+    assert logs[0].args._kernel_creator == w3.eth.defaultAccount
+    assert logs[0].args._notification_key == 1
+    assert logs[0].args._notification_value == 42
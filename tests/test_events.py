@@ -0,0 +1,75 @@
+from web3 import (Web3,)
+
+from conftest import (
+    POSITION_STATUS_CLOSED,
+    POSITION_STATUS_OPEN,
+)
+
+
+POSITION_NOTIFICATION_STATUS = 1
+POSITION_NOTIFICATION_BORROW_CURRENCY_VALUE = 2
+POSITION_NOTIFICATION_EXPIRES_AT = 3
+
+
+def test_position_events_are_indexed_by_borrower_lender_and_hash(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt):
+    tx_receipt = w3.eth.getTransactionReceipt(fill_kernel(kernel_fill('0x{0}'.format(random_salt), 1)))
+    position_hash = Protocol.functions.position_index(0).call()
+    logs = Protocol.events.PositionUpdateNotification().processReceipt(tx_receipt)
+    assert len(logs) == 1
+    assert logs[0].args._wrangler == w3.eth.wranglerAccount.address
+    assert logs[0].args._borrower == w3.eth.borrowerAccount.address
+    assert logs[0].args._lender == w3.eth.lenderAccount.address
+    assert logs[0].args._position_hash == position_hash
+    assert logs[0].args._notification_key == POSITION_NOTIFICATION_STATUS
+    assert logs[0].args._notification_value == POSITION_STATUS_OPEN
+    # wallets can filter the notifications of their own positions
+    borrower_logs = w3.eth.getLogs({
+        'address': Protocol.address,
+        'topics': [None, '0x{0}'.format(w3.eth.borrowerAccount.address[2:].lower().rjust(64, '0'))],
+        'fromBlock': tx_receipt['blockNumber']
+    })
+    assert [log['transactionHash'] for log in borrower_logs] == [tx_receipt['transactionHash']]
+    # and the notifications of a single position
+    position_logs = w3.eth.getLogs({
+        'address': Protocol.address,
+        'topics': [None, None, None, Web3.toHex(position_hash)],
+        'fromBlock': tx_receipt['blockNumber']
+    })
+    assert [log['transactionHash'] for log in position_logs] == [tx_receipt['transactionHash']]
+
+
+def test_position_events_notify_the_updated_values(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    # topups notify the new borrow currency value
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.topup_position(position_hash, Web3.toWei('0.5', 'ether')), gas=1000000)
+    logs = Protocol.events.PositionUpdateNotification().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+    assert len(logs) == 1
+    assert logs[0].args._lender == w3.eth.lenderAccount.address
+    assert logs[0].args._notification_key == POSITION_NOTIFICATION_BORROW_CURRENCY_VALUE
+    assert logs[0].args._notification_value == Web3.toWei('0.6', 'ether')
+    # closes notify the new status
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    logs = Protocol.events.PositionUpdateNotification().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+    assert len(logs) == 1
+    assert logs[0].args._borrower == w3.eth.borrowerAccount.address
+    assert logs[0].args._notification_key == POSITION_NOTIFICATION_STATUS
+    assert logs[0].args._notification_value == POSITION_STATUS_CLOSED
+
+
+def test_kernel_events_notify_the_remaining_value(w3, Protocol, Market, kernel_fill, fill_kernel, cancel_kernel_args, transact_as_local_account, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    tx_receipt = w3.eth.getTransactionReceipt(fill_kernel(fill))
+    logs = Protocol.events.KernelFilled().processReceipt(tx_receipt)
+    assert len(logs) == 1
+    kernel_hash = logs[0].args._kernel_hash
+    assert logs[0].args._kernel_creator == w3.eth.lenderAccount.address
+    assert logs[0].args._filled_value == Web3.toWei('1', 'ether')
+    assert logs[0].args._remaining_value == Web3.toWei('39', 'ether')
+    # cancellations are notified under the same kernel hash
+    tx_hash = transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('30', 'ether'))), gas=1000000)
+    logs = Protocol.events.KernelCancelled().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+    assert len(logs) == 1
+    assert logs[0].args._kernel_hash == kernel_hash
+    assert logs[0].args._kernel_creator == w3.eth.lenderAccount.address
+    assert logs[0].args._cancelled_value == Web3.toWei('30', 'ether')
+    assert logs[0].args._remaining_value == Web3.toWei('9', 'ether')
@@ -1,5 +1,7 @@
 from web3 import (Web3,)
 
+from conftest import (chain_timestamp,)
+
 def transact_as_local_account(w3, local_account, transaction_function, gas=70000):
     transaction_params = transaction_function.buildTransaction({
         'gas': 70000,
@@ -23,7 +25,7 @@ def test_fill_kernel(w3, Protocol, LST_token, Lend_token, Borrow_token, random_s
     kernel_monitoring_fee = Web3.toWei('10', 'ether')
     kernel_rollover_fee = Web3.toWei('10', 'ether')
     kernel_closure_fee = Web3.toWei('10', 'ether')
-    kernel_expires_at = w3.eth.getBlock('latest').timestamp + 86400*2
+    kernel_expires_at = chain_timestamp(w3) + 86400*2
     kernel_creator_salt = '0x{0}'.format(random_salt)
     position_lending_currency_fill_value = Web3.toWei('10', 'ether')
     position_borrow_currency_fill_value = Web3.toWei('1.1', 'ether')
@@ -95,7 +97,7 @@ def test_fill_kernel(w3, Protocol, LST_token, Lend_token, Borrow_token, random_s
     _signature = w3.eth.account.signHash(position_hash, private_key=w3.eth.wranglerAccount.privateKey)
     wrangler_signature = _signature.signature
     # prepare inputs for kernel fill
-    wrangler_approval_expiry_timestamp = w3.eth.getBlock('latest').timestamp + wrangler_approval_duration_in_seconds
+    wrangler_approval_expiry_timestamp = chain_timestamp(w3) + wrangler_approval_duration_in_seconds
     is_creator_lender = True
     # verify kernel has been neither filled nor cancelled
     assert Protocol.functions.kernels_filled(kernel_hash).call() == 0
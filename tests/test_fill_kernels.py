@@ -0,0 +1,79 @@
+from web3 import (Web3,)
+
+from conftest import (FILL_KERNELS_BATCH_SIZE,)
+
+
+def test_fill_kernels_opens_a_position_per_entry(w3, Protocol, LST_token, Lend_token, Borrow_token, Market, kernel_fill, fill_kernels_args, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    fills = [kernel_fill(kernel_creator_salt, nonce) for nonce in range(1, 4)]
+    args = fill_kernels_args(fills)
+    assert Protocol.functions.fill_kernels(*args).call() == [True] * 3 + [False] * (FILL_KERNELS_BATCH_SIZE - 3)
+    Protocol.functions.fill_kernels(*args).transact({'from': w3.eth.defaultAccount})
+    # position_index confirm
+    assert Protocol.functions.last_position_index().call() == 3
+    assert Protocol.functions.position_counts(w3.eth.lenderAccount.address).call() == [0, 3]
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [3, 0]
+    assert Protocol.functions.wrangler_nonce_bitmaps(w3.eth.wranglerAccount.address, w3.eth.lenderAccount.address, 0).call() == 0b1110
+    # balances confirm
+    assert Borrow_token.functions.balanceOf(Protocol.address).call() == 3 * Web3.toWei('0.1', 'ether')
+    assert Lend_token.functions.balanceOf(w3.eth.borrowerAccount.address).call() == Web3.toWei('103', 'ether')
+    assert LST_token.functions.balanceOf(w3.eth.wranglerAccount.address).call() == 3 * Web3.toWei('1', 'ether')
+    assert LST_token.functions.balanceOf(w3.eth.relayerAccount.address).call() == 3 * Web3.toWei('1', 'ether')
+
+
+def test_fill_kernels_skips_entries_that_fail_validation(w3, Protocol, Lend_token, Borrow_token, Market, kernel_fill, fill_kernels_args, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    fills = [
+        kernel_fill(kernel_creator_salt, 1),
+        # wrangler nonce used by the first entry
+        kernel_fill(kernel_creator_salt, 1),
+        kernel_fill(kernel_creator_salt, 2),
+    ]
+    # kernel creator signature that does not match the kernel
+    fills.append(fills[2][:8] + (fills[0][9], fills[2][9]))
+    args = fill_kernels_args(fills)
+    assert Protocol.functions.fill_kernels(*args).call()[:4] == [True, False, True, False]
+    Protocol.functions.fill_kernels(*args).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 2
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [2, 0]
+    assert Lend_token.functions.balanceOf(w3.eth.borrowerAccount.address).call() == Web3.toWei('102', 'ether')
+
+
+def test_fill_kernels_reverts_entirely_on_a_failed_transfer(w3, Protocol, Lend_token, Borrow_token, Market, kernel_fill, fill_kernels_args, transact_as_local_account, assert_tx_failed, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    fills = [kernel_fill(kernel_creator_salt, nonce) for nonce in range(1, 4)]
+    # the borrower's allowance covers the collateral of the first entry only
+    transact_as_local_account(w3.eth.borrowerAccount, Borrow_token.functions.approve(Protocol.address, Web3.toWei('0.1', 'ether')))
+    assert_tx_failed(lambda: Protocol.functions.fill_kernels(*fill_kernels_args(fills)).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.last_position_index().call() == 0
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [0, 0]
+    assert Borrow_token.functions.balanceOf(Protocol.address).call() == 0
+    assert Lend_token.functions.balanceOf(w3.eth.borrowerAccount.address).call() == Web3.toWei('100', 'ether')
+
+
+def test_fill_kernels_skips_entries_of_unsupported_markets(w3, Protocol, Market, kernel_fill, fill_kernels_args, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    fills = [kernel_fill(kernel_creator_salt, nonce) for nonce in range(1, 3)]
+    Protocol.functions.set_wrangler_status(w3.eth.wranglerAccount.address, False).transact({'from': w3.eth.defaultAccount})
+    args = fill_kernels_args(fills)
+    assert Protocol.functions.fill_kernels(*args).call() == [False] * FILL_KERNELS_BATCH_SIZE
+    Protocol.functions.fill_kernels(*args).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 0
+
+
+def test_fill_kernels_gas_per_position_is_lower_than_separate_fills(w3, Protocol, Market, kernel_fill, fill_kernels_args, random_salt, record_gas):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    number_of_positions = FILL_KERNELS_BATCH_SIZE
+    # N separate fill_kernel calls
+    separate_gas_used = 0
+    for nonce in range(1, number_of_positions + 1):
+        fill = kernel_fill(kernel_creator_salt, nonce)
+        tx_hash = Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+        separate_gas_used += w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    assert Protocol.functions.last_position_index().call() == number_of_positions
+    # one fill_kernels call with N entries
+    fills = [kernel_fill(kernel_creator_salt, nonce) for nonce in range(number_of_positions + 1, 2 * number_of_positions + 1)]
+    tx_hash = Protocol.functions.fill_kernels(*fill_kernels_args(fills)).transact({'from': w3.eth.defaultAccount})
+    batch_gas_used = record_gas('fill_kernels/full_batch', tx_hash)
+    assert Protocol.functions.last_position_index().call() == 2 * number_of_positions
+    assert batch_gas_used < separate_gas_used
@@ -0,0 +1,47 @@
+from web3 import (Web3,)
+
+
+def fill_state(Protocol, fill):
+    addresses, values, nonce, daily_interest_rate, is_creator_lender, timestamps, duration, salt, kernel_signature, position_signature = fill
+    return Protocol.functions.fill_state(addresses, values, nonce, daily_interest_rate, is_creator_lender, timestamps[0], duration, salt, kernel_signature).call()
+
+
+def test_fill_state_before_and_after_a_fill(w3, Protocol, Market, kernel_fill, random_salt):
+    Protocol.functions.set_position_threshold(1).transact({'from': w3.eth.defaultAccount})
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    assert fill_state(Protocol, fill) == [
+        True, True, True, False, True, True, True, 0, 0, Web3.toWei('40', 'ether')
+    ]
+    Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+    # the nonce is used, the position thresholds are reached and the kernel is partly filled
+    assert fill_state(Protocol, fill) == [
+        True, True, True, True, False, False, True, 0, Web3.toWei('1', 'ether'), Web3.toWei('39', 'ether')
+    ]
+
+
+def test_fill_state_of_inactive_tokens_wrangler_and_salts(w3, Protocol, Market, Borrow_token, kernel_fill, transact_as_local_account, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    Protocol.functions.set_token_support(Borrow_token.address, False).transact({'from': w3.eth.defaultAccount})
+    Protocol.functions.set_wrangler_status(w3.eth.wranglerAccount.address, False).transact({'from': w3.eth.defaultAccount})
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(5))
+    state = fill_state(Protocol, fill)
+    assert state[:3] == [False, True, False]
+    # the minimum salt is the lender's, who created the kernel
+    assert state[7] == 5
+
+
+def test_fill_state_of_kernel_signatures_and_registrations(w3, Protocol, Market, kernel_fill, kernel_hash_of, transact_as_local_account, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    # signatures of another kernel or signer are invalid
+    assert fill_state(Protocol, fill[:8] + (kernel_fill('0x{0}'.format(random_salt[::-1]), 1)[8], fill[9]))[6] is False
+    # a kernel without a signature must be registered by its creator
+    registered_fill = fill[:8] + (b'', fill[9])
+    assert fill_state(Protocol, registered_fill)[6] is False
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash_of(fill), True))
+    assert fill_state(Protocol, registered_fill)[6] is True
+
+
+def test_fill_state_of_cancelled_kernel(w3, Protocol, Market, kernel_fill, cancel_kernel_args, transact_as_local_account, random_salt):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1)
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('40', 'ether'))), gas=1000000)
+    assert fill_state(Protocol, fill)[8:] == [Web3.toWei('40', 'ether'), 0]
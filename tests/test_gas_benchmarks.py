@@ -0,0 +1,163 @@
+from web3 import (Web3,)
+
+from conftest import (
+    EMPTY_BYTES32,
+    POSITION_BATCH_SIZE,
+    ZERO_ADDRESS,
+)
+
+
+def test_fill_kernel_gas(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt, record_gas):
+    first_fill, repeat_fill = [kernel_fill('0x{0}'.format(random_salt), nonce) for nonce in [1, 2]]
+    record_gas('fill_kernel/first_fill', fill_kernel(first_fill))
+    record_gas('fill_kernel/repeat_fill', fill_kernel(repeat_fill))
+
+
+def test_fill_kernel_without_relayer_gas(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt, record_gas):
+    fill = kernel_fill('0x{0}'.format(random_salt), 1, relayer_address=ZERO_ADDRESS)
+    record_gas('fill_kernel/without_relayer', fill_kernel(fill))
+
+
+def test_fill_kernel_at_position_threshold_gas(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt, record_gas):
+    position_threshold = Protocol.functions.position_threshold().call()
+    fills = [kernel_fill('0x{0}'.format(random_salt), nonce) for nonce in range(1, position_threshold + 1)]
+    for fill in fills[:-1]:
+        fill_kernel(fill)
+    # the last position the borrower and lender can open
+    record_gas('fill_kernel/at_position_threshold', fill_kernel(fills[-1]))
+    assert Protocol.functions.can_borrow(w3.eth.borrowerAccount.address).call() is False
+
+
+def test_fill_kernels_gas(w3, Protocol, Market, kernel_fill, fill_kernels_args, random_salt, record_gas):
+    fills = [kernel_fill('0x{0}'.format(random_salt), nonce) for nonce in range(1, 4)]
+    record_gas('fill_kernels/partial_batch', Protocol.functions.fill_kernels(*fill_kernels_args(fills)).transact({'from': w3.eth.defaultAccount}))
+
+
+def test_register_kernel_gas(w3, Protocol, kernel_fill, kernel_hash_of, transact_as_local_account, random_salt, record_gas):
+    kernel_hash = kernel_hash_of(kernel_fill('0x{0}'.format(random_salt), 1))
+    for scenario, is_registered in [('register', True), ('unregister', False)]:
+        record_gas('register_kernel/{0}'.format(scenario), transact_as_local_account(
+            w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash, is_registered)
+        ))
+
+
+def test_cancel_kernel_gas(w3, Protocol, Market, kernel_fill, fill_kernel, cancel_kernel_args, transact_as_local_account, random_salt, record_gas):
+    unfilled, filled = [kernel_fill('0x{0}'.format(salt), 1) for salt in [random_salt, random_salt[::-1]]]
+    fill_kernel(filled)
+    for scenario, fill in [('unfilled', unfilled), ('filled', filled)]:
+        record_gas('cancel_kernel/{0}'.format(scenario), transact_as_local_account(
+            w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fill, Web3.toWei('10', 'ether'))), gas=1000000
+        ))
+
+
+def test_cancel_kernels_up_to_gas(w3, Protocol, transact_as_local_account, record_gas):
+    record_gas('cancel_kernels_up_to/raise_minimum_salt', transact_as_local_account(
+        w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(2)
+    ))
+
+
+def test_topup_position_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    for scenario in ['first_topup', 'repeat_topup']:
+        record_gas('topup_position/{0}'.format(scenario), transact_as_local_account(
+            w3.eth.borrowerAccount, Protocol.functions.topup_position(position_hash, Web3.toWei('1', 'ether')), gas=1000000
+        ))
+
+
+def test_topup_positions_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    hashes = position_hashes + [EMPTY_BYTES32] * (POSITION_BATCH_SIZE - 3)
+    increments = [Web3.toWei('0.5', 'ether')] * 3 + [0] * (POSITION_BATCH_SIZE - 3)
+    record_gas('topup_positions/partial_batch', transact_as_local_account(
+        w3.eth.borrowerAccount, Protocol.functions.topup_positions(hashes, increments), gas=1000000
+    ))
+
+
+def test_close_position_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    record_gas('close_position/only_position', transact_as_local_account(
+        w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000
+    ))
+
+
+def test_close_position_at_position_threshold_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, Protocol.functions.position_threshold().call() + 1))
+    # the last positions of the borrower and lender are moved into the closed positions' slots
+    record_gas('close_position/at_position_threshold', transact_as_local_account(
+        w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[0]), gas=1000000
+    ))
+
+
+def test_close_position_with_archival_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    Protocol.functions.set_archive_positions(True).transact({'from': w3.eth.defaultAccount})
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    record_gas('close_position/with_archival', transact_as_local_account(
+        w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000
+    ))
+
+
+def test_close_positions_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    record_gas('close_positions/partial_batch', transact_as_local_account(
+        w3.eth.borrowerAccount, Protocol.functions.close_positions(position_hashes + [EMPTY_BYTES32] * (POSITION_BATCH_SIZE - 3)), gas=1000000
+    ))
+
+
+def test_liquidate_position_gas(w3, Protocol, Market, open_positions, expire_position, transact_as_local_account, random_salt, record_gas):
+    position_hashes = open_positions('0x{0}'.format(random_salt), [1, 2])
+    # the last position expires last
+    expire_position(position_hashes[-1])
+    for scenario, account, position_hash in [
+        ('by_lender', w3.eth.lenderAccount, position_hashes[0]),
+        ('by_wrangler', w3.eth.wranglerAccount, position_hashes[1]),
+    ]:
+        record_gas('liquidate_position/{0}'.format(scenario), transact_as_local_account(
+            account, Protocol.functions.liquidate_position(position_hash), gas=1000000
+        ))
+
+
+def test_liquidate_positions_gas(w3, Protocol, Market, open_positions, expire_position, transact_as_local_account, random_salt, record_gas):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    expire_position(position_hashes[-1])
+    record_gas('liquidate_positions/partial_batch', transact_as_local_account(
+        w3.eth.wranglerAccount, Protocol.functions.liquidate_positions(position_hashes + [EMPTY_BYTES32] * (POSITION_BATCH_SIZE - 3)), gas=1000000
+    ))
+
+
+def test_rollover_position_gas(w3, Protocol, LST_token, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    # the borrower pays rollover fees in LST
+    LST_token.functions.mint(w3.eth.borrowerAccount.address, Web3.toWei('10', 'ether')).transact({'from': w3.eth.defaultAccount})
+    transact_as_local_account(w3.eth.borrowerAccount, LST_token.functions.approve(Protocol.address, Web3.toWei('10', 'ether')))
+    for scenario in ['first_rollover', 'repeat_rollover']:
+        record_gas('rollover_position/{0}'.format(scenario), transact_as_local_account(
+            w3.eth.borrowerAccount, Protocol.functions.rollover_position(position_hash), gas=1000000
+        ))
+
+
+def test_deposit_and_withdraw_gas(w3, Protocol, Lend_token, Market, transact_as_local_account, record_gas):
+    for key, transaction_function in [
+        ('deposit/first_deposit', Protocol.functions.deposit(Lend_token.address, Web3.toWei('10', 'ether'))),
+        ('deposit/repeat_deposit', Protocol.functions.deposit(Lend_token.address, Web3.toWei('10', 'ether'))),
+        ('withdraw/partial_balance', Protocol.functions.withdraw(Lend_token.address, Web3.toWei('10', 'ether'))),
+        ('withdraw/full_balance', Protocol.functions.withdraw(Lend_token.address, Web3.toWei('10', 'ether'))),
+    ]:
+        record_gas(key, transact_as_local_account(w3.eth.lenderAccount, transaction_function, gas=200000))
+
+
+def test_owner_setters_gas(w3, Protocol, Lend_token, record_gas):
+    for key, transaction_function in [
+        ('set_position_threshold/update', Protocol.functions.set_position_threshold(20)),
+        ('set_wrangler_status/activate', Protocol.functions.set_wrangler_status(w3.eth.wranglerAccount.address, True)),
+        ('set_wrangler_status/deactivate', Protocol.functions.set_wrangler_status(w3.eth.wranglerAccount.address, False)),
+        ('set_token_support/activate', Protocol.functions.set_token_support(Lend_token.address, True)),
+        ('set_token_support/deactivate', Protocol.functions.set_token_support(Lend_token.address, False)),
+        ('set_archive_positions/activate', Protocol.functions.set_archive_positions(True)),
+        ('set_archive_positions/deactivate', Protocol.functions.set_archive_positions(False)),
+    ]:
+        record_gas(key, transaction_function.transact({'from': w3.eth.defaultAccount}))
+
+
+def test_escape_hatch_token_gas(w3, Protocol, Lend_token, record_gas):
+    Lend_token.functions.mint(Protocol.address, Web3.toWei('1', 'ether')).transact({'from': w3.eth.defaultAccount})
+    record_gas('escape_hatch_token/with_balance', Protocol.functions.escape_hatch_token(Lend_token.address).transact({'from': w3.eth.defaultAccount}))
@@ -0,0 +1,79 @@
+from web3 import (Web3,)
+
+from conftest import (
+    SIGNATURE_SCHEME_EIP712,
+    ZERO_ADDRESS,
+)
+
+from kernel_batches import (
+    batch_signature,
+    merkle_proof,
+    merkle_root,
+    merkle_tree,
+)
+
+
+def signed_batch(w3, kernel_fill, kernel_hash_of, sign_hash, number_of_kernels, signature_scheme=None, signer=None):
+    """
+    Returns `fill_kernel` arguments for a batch of kernels whose creator signed
+    only the batch root, along with that root.
+    """
+    fills = [kernel_fill('0x{0:064x}'.format(salt), salt) for salt in range(1, number_of_kernels + 1)]
+    tree = merkle_tree([kernel_hash_of(fill) for fill in fills])
+    root_signature = sign_hash(merkle_root(tree), signer or w3.eth.lenderAccount, signature_scheme)
+    return [
+        fill[:8] + (batch_signature(root_signature, merkle_proof(tree, index)), fill[9])
+        for index, fill in enumerate(fills)
+    ], merkle_root(tree)
+
+
+def test_merkle_proofs_lead_to_the_root():
+    for number_of_leaves in range(1, 8):
+        leaves = [Web3.sha3(text=str(i)) for i in range(number_of_leaves)]
+        tree = merkle_tree(leaves)
+        for index, leaf in enumerate(leaves):
+            node = bytes(leaf)
+            for sibling in merkle_proof(tree, index):
+                node = bytes(Web3.sha3(b''.join(sorted([node, sibling]))))
+            assert node == merkle_root(tree)
+
+
+def test_fill_kernels_of_a_signed_batch(w3, Protocol, Market, kernel_fill, kernel_hash_of, sign_hash, record_gas):
+    fills, root = signed_batch(w3, kernel_fill, kernel_hash_of, sign_hash, 5, SIGNATURE_SCHEME_EIP712)
+    gas_used = []
+    for scenario, fill in [('first_batch_kernel', fills[3]), ('second_batch_kernel', fills[0]), ('third_batch_kernel', fills[4])]:
+        tx_hash = Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+        gas_used.append(record_gas('fill_kernel/{0}'.format(scenario), tx_hash))
+    assert Protocol.functions.last_position_index().call() == 3
+    assert Protocol.functions.kernel_batch_signers(root).call() == w3.eth.lenderAccount.address
+    # once the root signature is verified, later kernels of the batch skip the recovery
+    assert gas_used[1] < gas_used[0]
+
+
+def test_fill_kernel_rejects_a_proof_of_another_kernel(w3, Protocol, Market, kernel_fill, kernel_hash_of, sign_hash, assert_tx_failed):
+    fills, root = signed_batch(w3, kernel_fill, kernel_hash_of, sign_hash, 4)
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*(fills[0][:8] + (fills[1][8], fills[0][9]))).transact({'from': w3.eth.defaultAccount}))
+    Protocol.functions.fill_kernel(*fills[0]).transact({'from': w3.eth.defaultAccount})
+    # a verified root does not make proofs of other kernels valid
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*(fills[2][:8] + (fills[3][8], fills[2][9]))).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.last_position_index().call() == 1
+
+
+def test_fill_kernel_rejects_a_batch_signed_by_another_account(w3, Protocol, Market, kernel_fill, kernel_hash_of, sign_hash, assert_tx_failed):
+    fills, root = signed_batch(w3, kernel_fill, kernel_hash_of, sign_hash, 2, signer=w3.eth.borrowerAccount)
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fills[0]).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.kernel_batch_signers(root).call() == ZERO_ADDRESS
+
+
+def test_cancel_kernel_of_a_signed_batch(w3, Protocol, Market, kernel_fill, kernel_hash_of, sign_hash, cancel_kernel_args, transact_as_local_account, assert_tx_failed):
+    fills, root = signed_batch(w3, kernel_fill, kernel_hash_of, sign_hash, 3)
+    # the batch signature and the kernel's proof are accepted by cancel_kernel as by fill_kernel
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fills[1], Web3.toWei('40', 'ether'))), gas=1000000)
+    assert w3.eth.getTransactionReceipt(tx_hash)['status'] == 0
+    tx_hash = transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(fills[1], Web3.toWei('40', 'ether'))), gas=1000000)
+    assert w3.eth.getTransactionReceipt(tx_hash)['status'] == 1
+    assert Protocol.functions.kernels_cancelled(kernel_hash_of(fills[1])).call() == Web3.toWei('40', 'ether')
+    # only the cancelled kernel of the batch can no longer be filled
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fills[1]).transact({'from': w3.eth.defaultAccount}))
+    Protocol.functions.fill_kernel(*fills[0]).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 1
@@ -0,0 +1,32 @@
+from conftest import (
+    POSITION_STATUS_LIQUIDATED,
+    POSITION_STATUS_OPEN,
+)
+
+
+def test_liquidate_position_should_not_work_before_position_has_expired(w3, Protocol, Market, open_positions, assert_local_tx_failed, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    for account in [w3.eth.lenderAccount, w3.eth.wranglerAccount]:
+        assert_local_tx_failed(account, Protocol.functions.liquidate_position(position_hash), gas=1000000)
+        assert Protocol.functions.position(position_hash).call()[15] == POSITION_STATUS_OPEN
+
+
+def test_liquidate_position_should_be_callable_by_lender(w3, Protocol, Market, open_positions, expire_position, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    expire_position(position_hash)
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.liquidate_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call()[15] == POSITION_STATUS_LIQUIDATED
+
+
+def test_liquidate_position_should_be_callable_by_wrangler(w3, Protocol, Market, open_positions, expire_position, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    expire_position(position_hash)
+    transact_as_local_account(w3.eth.wranglerAccount, Protocol.functions.liquidate_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call()[15] == POSITION_STATUS_LIQUIDATED
+
+
+def test_liquidate_position_should_not_be_callable_by_borrower(w3, Protocol, Market, open_positions, expire_position, assert_local_tx_failed, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    expire_position(position_hash)
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.liquidate_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call()[15] == POSITION_STATUS_OPEN
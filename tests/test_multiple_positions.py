@@ -0,0 +1,58 @@
+from web3 import (Web3,)
+
+from conftest import (EMPTY_BYTES32,)
+
+
+def kernel_fills(kernel_fill, random_salt, nonces_and_fill_values):
+    # fills of a single kernel
+    return [
+        kernel_fill('0x{0}'.format(random_salt), nonce, lend_currency_fill_value=Web3.toWei(fill_value, 'ether'))
+        for nonce, fill_value in nonces_and_fill_values
+    ]
+
+
+def borrow_positions(Protocol, address):
+    borrow_positions_count = Protocol.functions.position_counts(address).call()[0]
+    return [Protocol.functions.borrow_positions(address, index).call() for index in range(1, borrow_positions_count + 2)]
+
+
+def test_kernel_should_be_filled_by_positions_with_different_nonces_within_its_value(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt):
+    for fill in kernel_fills(kernel_fill, random_salt, [(1, '20'), (2, '20')]):
+        fill_kernel(fill)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [2, 0]
+
+
+def test_kernel_should_not_be_filled_by_positions_with_the_same_nonce(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt, assert_tx_failed):
+    first_fill, second_fill = kernel_fills(kernel_fill, random_salt, [(1, '10'), (1, '20')])
+    fill_kernel(first_fill)
+    assert_tx_failed(lambda: fill_kernel(second_fill))
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [1, 0]
+
+
+def test_kernel_should_not_be_filled_above_its_value(w3, Protocol, Market, kernel_fill, fill_kernel, random_salt, assert_tx_failed):
+    first_fill, second_fill = kernel_fills(kernel_fill, random_salt, [(1, '30'), (2, '20')])
+    fill_kernel(first_fill)
+    assert_tx_failed(lambda: fill_kernel(second_fill))
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [1, 0]
+
+
+def test_kernel_should_be_filled_up_to_its_value_left_after_a_cancellation(w3, Protocol, Market, kernel_fill, fill_kernel, cancel_kernel_args, transact_as_local_account, random_salt, assert_tx_failed):
+    first_fill, second_fill, third_fill = kernel_fills(kernel_fill, random_salt, [(1, '30'), (2, '6'), (3, '5')])
+    fill_kernel(first_fill)
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_kernel_args(first_fill, Web3.toWei('5', 'ether'))), gas=1000000)
+    assert_tx_failed(lambda: fill_kernel(second_fill))
+    fill_kernel(third_fill)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [2, 0]
+
+
+def test_positions_should_not_be_overridden_after_a_close(w3, Protocol, Market, kernel_fill, fill_kernel, transact_as_local_account, random_salt):
+    fills = kernel_fills(kernel_fill, random_salt, [(nonce, '1') for nonce in range(1, 5)])
+    for fill in fills[:3]:
+        fill_kernel(fill)
+    first_position, second_position, third_position = borrow_positions(Protocol, w3.eth.borrowerAccount.address)[:3]
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(first_position), gas=1000000)
+    assert borrow_positions(Protocol, w3.eth.borrowerAccount.address) == [third_position, second_position, EMPTY_BYTES32]
+    fill_kernel(fills[3])
+    positions = borrow_positions(Protocol, w3.eth.borrowerAccount.address)
+    assert positions[:2] == [third_position, second_position]
+    assert positions[2] not in [EMPTY_BYTES32, first_position]
@@ -0,0 +1,83 @@
+from conftest import (
+    EMPTY_BYTES32,
+    POSITION_STATUS_CLOSED,
+    POSITION_STATUS_LIQUIDATED,
+    ZERO_ADDRESS,
+)
+
+
+def assert_archived(Protocol, position_hash, position, status):
+    archived_position = Protocol.functions.position(position_hash).call()
+    # the index, timestamps, status and hash are kept, all other fields are cleared
+    assert archived_position[0] == position[0]
+    assert archived_position[6:9] == position[6:9]
+    assert archived_position[15] == status
+    assert archived_position[21] == position_hash
+    assert archived_position[1:6] == [ZERO_ADDRESS] * 5
+    assert archived_position[9:11] == [ZERO_ADDRESS] * 2
+    assert archived_position[11:15] + archived_position[16:21] == [0] * 9
+    assert Protocol.functions.position_index(position[0]).call() == EMPTY_BYTES32
+
+
+def assert_archive_logged(w3, Protocol, tx_hash, position):
+    logs = Protocol.events.PositionArchiveNotification().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+    assert len(logs) == 1
+    args = logs[0].args
+    assert args._position_hash == position[21]
+    assert [args._kernel_creator, args._lender, args._borrower, args._relayer, args._wrangler] == position[1:6]
+    assert [args._borrow_currency_address, args._lend_currency_address] == position[9:11]
+    assert [args._borrow_currency_value, args._borrow_currency_current_value, args._lend_currency_filled_value, args._lend_currency_owed_value] == position[11:15]
+    assert [args._nonce, args._relayer_fee, args._monitoring_fee, args._rollover_fee, args._closure_fee] == position[16:21]
+
+
+def test_set_archive_positions_should_be_called_only_by_owner(w3, Protocol, assert_tx_failed):
+    assert Protocol.functions.archive_positions().call() == False
+    assert_tx_failed(lambda: Protocol.functions.set_archive_positions(True).transact({'from': w3.eth.maliciousUserAccount}))
+    assert Protocol.functions.archive_positions().call() == False
+    Protocol.functions.set_archive_positions(True).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.archive_positions().call() == True
+
+
+def test_close_position_archives_the_position(w3, Protocol, Market, open_positions, transact_as_local_account, assert_local_tx_failed, random_salt):
+    Protocol.functions.set_archive_positions(True).transact({'from': w3.eth.defaultAccount})
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    position = Protocol.functions.position(position_hash).call()
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    assert_archive_logged(w3, Protocol, tx_hash, position)
+    assert_archived(Protocol, position_hash, position, POSITION_STATUS_CLOSED)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [0, 0]
+    # archived positions cannot be closed again
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    assert_archived(Protocol, position_hash, position, POSITION_STATUS_CLOSED)
+
+
+def test_liquidate_position_archives_the_position(w3, Protocol, Market, open_positions, expire_position, transact_as_local_account, random_salt):
+    Protocol.functions.set_archive_positions(True).transact({'from': w3.eth.defaultAccount})
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    position = Protocol.functions.position(position_hash).call()
+    expire_position(position_hash)
+    tx_hash = transact_as_local_account(w3.eth.wranglerAccount, Protocol.functions.liquidate_position(position_hash), gas=1000000)
+    assert_archive_logged(w3, Protocol, tx_hash, position)
+    assert_archived(Protocol, position_hash, position, POSITION_STATUS_LIQUIDATED)
+
+
+def test_positions_are_kept_when_archival_is_off(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    assert Protocol.events.PositionArchiveNotification().processReceipt(w3.eth.getTransactionReceipt(tx_hash)) == ()
+    assert Protocol.functions.position(position_hash).call()[1] == w3.eth.lenderAccount.address
+    assert Protocol.functions.position_index(0).call() == position_hash
+
+
+def test_close_position_gas_with_archival(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    kept_gas_used = w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    Protocol.functions.set_archive_positions(True).transact({'from': w3.eth.defaultAccount})
+    position_hash, = open_positions('0x{0}'.format(random_salt), [2])
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    archived_gas_used = w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    # refunds are capped at half the gas used, which the index updates of a closure already reach,
+    # so the clearing is paid for by the closer
+    # packed_state is kept in place: clearing it and writing it back anew cost over 60000 more
+    assert archived_gas_used < kept_gas_used + 50000
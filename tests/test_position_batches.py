@@ -0,0 +1,66 @@
+from web3 import (Web3,)
+
+from conftest import (
+    EMPTY_BYTES32,
+    POSITION_BATCH_SIZE,
+    POSITION_STATUS_CLOSED,
+    POSITION_STATUS_LIQUIDATED,
+)
+
+
+def batch_of(position_hashes):
+    return position_hashes + [EMPTY_BYTES32] * (POSITION_BATCH_SIZE - len(position_hashes))
+
+
+def test_topup_positions(w3, Protocol, Borrow_token, Market, open_positions, transact_as_local_account, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 3))
+    # an unknown position is reported and skipped
+    hashes = batch_of(position_hashes + [Web3.sha3(text='unknown position')])
+    increments = [Web3.toWei('0.5', 'ether')] * 3 + [0] * (POSITION_BATCH_SIZE - 3)
+    # only the borrower can topup
+    assert Protocol.functions.topup_positions(hashes, increments).call({'from': w3.eth.lenderAccount.address}) == [False] * POSITION_BATCH_SIZE
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.topup_positions(hashes, increments), gas=1000000)
+    for position_hash in position_hashes:
+        assert Protocol.functions.position(position_hash).call()[12] == Web3.toWei('0.1', 'ether')
+    assert Protocol.functions.topup_positions(hashes, increments).call({'from': w3.eth.borrowerAccount.address}) == [True, True] + [False] * (POSITION_BATCH_SIZE - 2)
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.topup_positions(hashes, increments), gas=1000000)
+    for position_hash in position_hashes:
+        assert Protocol.functions.position(position_hash).call()[12] == Web3.toWei('0.6', 'ether')
+    assert Borrow_token.functions.balanceOf(Protocol.address).call() == 2 * Web3.toWei('0.6', 'ether')
+
+
+def test_close_positions_skips_positions_that_fail_validation(w3, Protocol, Borrow_token, Market, open_positions, transact_as_local_account, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[1]), gas=1000000)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [2, 0]
+    # an already closed position and an unknown position are reported and skipped
+    unknown_position_hash = Web3.sha3(text='unknown position')
+    hashes = batch_of(position_hashes + [unknown_position_hash])
+    assert Protocol.functions.close_positions(hashes).call({'from': w3.eth.borrowerAccount.address}) == [True, False, True] + [False] * (POSITION_BATCH_SIZE - 3)
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_positions(hashes), gas=1000000)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [0, 0]
+    assert Protocol.functions.position_counts(w3.eth.lenderAccount.address).call() == [0, 0]
+    for position_hash in position_hashes:
+        assert Protocol.functions.position(position_hash).call()[15] == POSITION_STATUS_CLOSED
+    assert Borrow_token.functions.balanceOf(Protocol.address).call() == 0
+
+
+def test_liquidate_positions_sweeps_expired_positions(w3, Protocol, Borrow_token, Market, open_positions, expire_position, transact_as_local_account, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    hashes = batch_of(position_hashes + [Web3.sha3(text='unknown position')])
+    # positions have not expired yet
+    assert Protocol.functions.liquidate_positions(hashes).call({'from': w3.eth.wranglerAccount.address}) == [False] * POSITION_BATCH_SIZE
+    transact_as_local_account(w3.eth.wranglerAccount, Protocol.functions.liquidate_positions(hashes), gas=1000000)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [3, 0]
+    expire_position(position_hashes[-1])
+    # only the lender or the wrangler can liquidate
+    assert Protocol.functions.liquidate_positions(hashes).call({'from': w3.eth.borrowerAccount.address}) == [False] * POSITION_BATCH_SIZE
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.liquidate_positions(hashes), gas=1000000)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [3, 0]
+    # the unknown position is reported and skipped
+    assert Protocol.functions.liquidate_positions(hashes).call({'from': w3.eth.wranglerAccount.address}) == [True] * 3 + [False] * (POSITION_BATCH_SIZE - 3)
+    transact_as_local_account(w3.eth.wranglerAccount, Protocol.functions.liquidate_positions(hashes), gas=1000000)
+    assert Protocol.functions.position_counts(w3.eth.borrowerAccount.address).call() == [0, 0]
+    for position_hash in position_hashes:
+        assert Protocol.functions.position(position_hash).call()[15] == POSITION_STATUS_LIQUIDATED
+    assert Borrow_token.functions.balanceOf(w3.eth.wranglerAccount.address).call() == 3 * Web3.toWei('0.1', 'ether')
@@ -0,0 +1,69 @@
+from conftest import (EMPTY_BYTES32,)
+
+
+def account_positions(Protocol, address):
+    borrow_positions_count, lend_positions_count = Protocol.functions.position_counts(address).call()
+    borrow_positions = [Protocol.functions.borrow_positions(address, index).call() for index in range(1, borrow_positions_count + 2)]
+    lend_positions = [Protocol.functions.lend_positions(address, index).call() for index in range(1, lend_positions_count + 2)]
+    # the slot past the last position is always empty
+    assert borrow_positions.pop() == EMPTY_BYTES32
+    assert lend_positions.pop() == EMPTY_BYTES32
+    return borrow_positions, lend_positions
+
+
+def test_removed_positions_are_swapped_with_the_last_position(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 5))
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == (position_hashes, [])
+    assert account_positions(Protocol, w3.eth.lenderAccount.address) == ([], position_hashes)
+    # the first position is replaced by the last one
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[0]), gas=1000000)
+    expected_hashes = [position_hashes[3], position_hashes[1], position_hashes[2]]
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == (expected_hashes, [])
+    assert account_positions(Protocol, w3.eth.lenderAccount.address) == ([], expected_hashes)
+    # the moved position is found at its new index
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[3]), gas=1000000)
+    expected_hashes = [position_hashes[2], position_hashes[1]]
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == (expected_hashes, [])
+    assert account_positions(Protocol, w3.eth.lenderAccount.address) == ([], expected_hashes)
+    # the last position is popped
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[1]), gas=1000000)
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == ([position_hashes[2]], [])
+    assert account_positions(Protocol, w3.eth.lenderAccount.address) == ([], [position_hashes[2]])
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[2]), gas=1000000)
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == ([], [])
+    assert account_positions(Protocol, w3.eth.lenderAccount.address) == ([], [])
+
+
+def test_positions_opened_after_removals_are_appended(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    position_hashes = open_positions(kernel_creator_salt, range(1, 4))
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[1]), gas=1000000)
+    position_hashes += open_positions(kernel_creator_salt, [4])
+    expected_hashes = [position_hashes[0], position_hashes[2], position_hashes[3]]
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == (expected_hashes, [])
+    # every position is still removed from its own index
+    for position_hash in expected_hashes:
+        transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == ([], [])
+    assert account_positions(Protocol, w3.eth.lenderAccount.address) == ([], [])
+
+
+def test_position_churn_gas(w3, Protocol, Market, kernel_fill, fill_kernel, open_positions, transact_as_local_account, random_salt, record_gas):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    # a long-lived position keeps the counts from dropping to zero
+    open_positions(kernel_creator_salt, [1])
+    for nonce in range(2, 7):
+        tx_hash = fill_kernel(kernel_fill(kernel_creator_salt, nonce))
+        position_hash = Protocol.functions.position_index(nonce - 1).call()
+        close_tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    # the last fill and closure reuse the index slots of the earlier ones
+    record_gas('fill_kernel/after_churn', tx_hash)
+    record_gas('close_position/after_churn', close_tx_hash)
+    assert account_positions(Protocol, w3.eth.borrowerAccount.address) == ([Protocol.functions.position_index(0).call()], [])
+
+
+def test_position_swap_gas(w3, Protocol, Market, open_positions, transact_as_local_account, random_salt, record_gas):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    # the first position is swapped with the last position of both its borrower and lender
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[0]), gas=1000000)
+    record_gas('close_position/swapped_with_last_position', tx_hash)
@@ -0,0 +1,58 @@
+POSITION_PAGE_SIZE = 20
+POSITION_FIELDS = 22
+EMPTY_ROW = [0] * POSITION_FIELDS
+
+
+def position_row(Protocol, position_hash):
+    # the reader returns every field of `position` as an integer
+    return [
+        int(field, 16) if isinstance(field, str) else int.from_bytes(field, 'big') if isinstance(field, bytes) else field
+        for field in Protocol.functions.position(position_hash).call()
+    ]
+
+
+def page_of(rows):
+    return rows + [EMPTY_ROW] * (POSITION_PAGE_SIZE - len(rows))
+
+
+def test_account_positions_pages(w3, Protocol, Position_reader, Market, open_positions, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    rows = [position_row(Protocol, position_hash) for position_hash in position_hashes]
+    borrower, lender = w3.eth.borrowerAccount.address, w3.eth.lenderAccount.address
+    assert Position_reader.functions.borrow_positions_page(borrower, 0, POSITION_PAGE_SIZE).call() == page_of(rows)
+    assert Position_reader.functions.lend_positions_page(lender, 0, POSITION_PAGE_SIZE).call() == page_of(rows)
+    # pages start from the offset and hold at most limit positions
+    assert Position_reader.functions.borrow_positions_page(borrower, 1, 1).call() == page_of(rows[1:2])
+    assert Position_reader.functions.lend_positions_page(lender, 2, 5).call() == page_of(rows[2:])
+    assert Position_reader.functions.borrow_positions_page(borrower, 3, 5).call() == page_of([])
+    # accounts only read their own side of the positions
+    assert Position_reader.functions.lend_positions_page(borrower, 0, POSITION_PAGE_SIZE).call() == page_of([])
+
+
+def test_positions_page(w3, Protocol, Position_reader, Market, open_positions, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    rows = [position_row(Protocol, position_hash) for position_hash in position_hashes]
+    assert Position_reader.functions.positions_page(0, POSITION_PAGE_SIZE).call() == page_of(rows)
+    assert Position_reader.functions.positions_page(1, 1).call() == page_of(rows[1:2])
+    assert Position_reader.functions.positions_page(3, POSITION_PAGE_SIZE).call() == page_of([])
+
+
+def test_expiring_positions_page(w3, Protocol, Position_reader, Market, open_positions, transact_as_local_account, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), range(1, 4))
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[1]), gas=1000000)
+    rows = [position_row(Protocol, position_hash) for position_hash in position_hashes]
+    expires_at = max(row[8] for row in rows)
+    # only open positions are returned, ahead of the page
+    assert Position_reader.functions.expiring_positions_page(expires_at + 1, 0, POSITION_PAGE_SIZE).call() == page_of([rows[0], rows[2]])
+    assert Position_reader.functions.expiring_positions_page(expires_at + 1, 1, 1).call() == page_of([])
+    assert Position_reader.functions.expiring_positions_page(expires_at + 1, 1, 2).call() == page_of([rows[2]])
+    assert Position_reader.functions.expiring_positions_page(min(row[8] for row in rows), 0, POSITION_PAGE_SIZE).call() == page_of([])
+
+
+def test_pages_reject_limits_above_the_page_size(w3, Protocol, Position_reader, Market, open_positions, random_salt, assert_tx_failed):
+    open_positions('0x{0}'.format(random_salt), range(1, 4))
+    borrower, lender = w3.eth.borrowerAccount.address, w3.eth.lenderAccount.address
+    assert_tx_failed(lambda: Position_reader.functions.borrow_positions_page(borrower, 0, 25).call())
+    assert_tx_failed(lambda: Position_reader.functions.lend_positions_page(lender, 0, 25).call())
+    assert_tx_failed(lambda: Position_reader.functions.positions_page(0, 25).call())
+    assert_tx_failed(lambda: Position_reader.functions.expiring_positions_page(2**64, 0, 25).call())
@@ -0,0 +1,56 @@
+from web3 import (Web3,)
+
+from conftest import (
+    EMPTY_BYTES32,
+    POSITION_STATUS_CLOSED,
+    POSITION_STATUS_OPEN,
+    ZERO_ADDRESS,
+    chain_timestamp,
+)
+
+
+def test_position_unpacks_the_stored_position(w3, Protocol, Lend_token, Borrow_token, Market, kernel_fill, transact_as_local_account, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1)).transact({'from': w3.eth.defaultAccount})
+    fill = kernel_fill(kernel_creator_salt, 2)
+    tx_hash = Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+    filled_at = w3.eth.getBlock(w3.eth.getTransactionReceipt(tx_hash)['blockNumber']).timestamp
+    position_hash = Protocol.functions.position_index(1).call()
+    lend_currency_owed_value = Protocol.functions.owed_value(fill[1][6], fill[3], fill[6]).call()
+    position = Protocol.functions.position(position_hash).call()
+    assert position == [
+        1,
+        w3.eth.lenderAccount.address, w3.eth.lenderAccount.address, w3.eth.borrowerAccount.address,
+        w3.eth.relayerAccount.address, w3.eth.wranglerAccount.address,
+        filled_at, filled_at, filled_at + fill[6],
+        Borrow_token.address, Lend_token.address,
+        fill[1][0], fill[1][0], fill[1][6], lend_currency_owed_value,
+        POSITION_STATUS_OPEN, 2,
+        fill[1][2], fill[1][3], fill[1][4], fill[1][5],
+        position_hash
+    ]
+    # status updates leave the other packed fields untouched
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    closed_position = Protocol.functions.position(position_hash).call()
+    assert closed_position[15] == POSITION_STATUS_CLOSED
+    assert closed_position[:15] + closed_position[16:] == position[:15] + position[16:]
+
+
+def test_position_of_unknown_hash_is_empty(w3, Protocol):
+    position = Protocol.functions.position(Web3.sha3(text='unknown position')).call()
+    assert position[1:6] == [ZERO_ADDRESS] * 5
+    assert position[15] == 0
+    assert position[21] == EMPTY_BYTES32
+
+
+def test_fill_kernel_rejects_expiries_past_the_packed_timestamp(w3, Protocol, Market, kernel_fill, random_salt, assert_tx_failed):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    # the expiry is packed into 64 bits
+    fill = kernel_fill(kernel_creator_salt, 1, position_duration_in_seconds=2**64 - 1)
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.last_position_index().call() == 0
+    fill = kernel_fill(kernel_creator_salt, 1, position_duration_in_seconds=2**64 - 1 - chain_timestamp(w3) - 3600)
+    Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+    position = Protocol.functions.position(Protocol.functions.position_index(0).call()).call()
+    assert position[8] == position[6] + fill[6]
+
@@ -9,6 +9,11 @@ def test_protocol_deploy(w3, LST_token, Protocol):
     assert Protocol.functions.protocol_token_address().call() == LST_token.address
 
 
+def test_protocol_code_size(w3, Protocol):
+    # EIP-170 limits the runtime code of a contract to 24576 bytes
+    assert len(w3.eth.getCode(Protocol.address)) <= 24576
+
+
 def test_lend_token_deploy(w3, Lend_token):
     assert Lend_token.functions.name().call() == 'Test Lend Token'
     assert Lend_token.functions.symbol().call() == 'TLT'
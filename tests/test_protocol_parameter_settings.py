@@ -56,3 +56,12 @@ def test_set_token_support_should_allow_owner_to_activate_deactivate_tokens(w3,
 
 def test_set_token_support_should_not_accept_non_contract_addresses(w3, Protocol, assert_tx_failed):
     assert_tx_failed(lambda: Protocol.functions.set_token_support(w3.eth.maliciousUserAccount, True).transact({'from': w3.eth.defaultAccount}))
+
+
+def test_protocol_parameter_updates_log_numeric_keys(w3, Protocol):
+    tx_hash = Protocol.functions.set_wrangler_status(w3.eth.wranglerAccount.address, True).transact({'from': w3.eth.defaultAccount})
+    logs = Protocol.events.ProtocolParameterUpdateNotification().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+    assert len(logs) == 1
+    assert logs[0].args._notification_key == 2
+    assert logs[0].args._address == w3.eth.wranglerAccount.address
+    assert logs[0].args._notification_value == 1
@@ -0,0 +1,74 @@
+import pytest
+
+from web3 import (Web3,)
+
+from conftest import (
+    EMPTY_BYTES32,
+    POSITION_BATCH_SIZE,
+    POSITION_STATUS_CLOSED,
+    POSITION_STATUS_OPEN,
+    ZERO_ADDRESS,
+    create_contract,
+)
+
+
+@pytest.fixture
+def Borrow_token(w3, get_contract):
+    # the collateral token calls back into the protocol from its transfers
+    return create_contract(
+        w3=w3,
+        get_contract=get_contract,
+        path='tests/contracts/ReentrantERC20.v.py',
+        constructor_args=[]
+    )
+
+
+def set_reentry(w3, Borrow_token, Protocol, fn_name, args):
+    data = Protocol.encodeABI(fn_name=fn_name, args=args)
+    Borrow_token.functions.set_reentry(Protocol.address, Web3.toBytes(hexstr=data)).transact({'from': w3.eth.defaultAccount})
+
+
+def test_reentrant_fill_kernel_is_rejected(w3, Protocol, Borrow_token, Market, kernel_fill, random_salt, assert_tx_failed):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    # the collateral transfer of the first fill makes a second, valid fill
+    set_reentry(w3, Borrow_token, Protocol, 'fill_kernel', kernel_fill(kernel_creator_salt, 2))
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1)).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.last_position_index().call() == 0
+
+
+def test_reentrant_call_to_unlocked_function_is_accepted(w3, Protocol, Borrow_token, Market, kernel_fill, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    set_reentry(w3, Borrow_token, Protocol, 'last_position_index', [])
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1)).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 1
+
+
+def test_reentrant_close_positions_is_rejected(w3, Protocol, Borrow_token, Market, open_positions, transact_as_local_account, assert_local_tx_failed, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), [1, 2])
+    # the collateral transfer back to the borrower settles another position
+    set_reentry(w3, Borrow_token, Protocol, 'close_positions', [[position_hashes[1]] + [EMPTY_BYTES32] * (POSITION_BATCH_SIZE - 1)])
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[0]), gas=1000000)
+    assert Protocol.functions.position(position_hashes[0]).call()[15] == POSITION_STATUS_OPEN
+    # without the reentry, the position is closed
+    Borrow_token.functions.set_reentry(ZERO_ADDRESS, b'').transact({'from': w3.eth.defaultAccount})
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hashes[0]), gas=1000000)
+    assert Protocol.functions.position(position_hashes[0]).call()[15] == POSITION_STATUS_CLOSED
+
+
+def test_reentrant_topup_positions_is_rejected(w3, Protocol, Borrow_token, Market, open_positions, assert_local_tx_failed, random_salt):
+    position_hashes = open_positions('0x{0}'.format(random_salt), [1])
+    borrow_currency_current_value = Protocol.functions.position(position_hashes[0]).call()[12]
+    set_reentry(w3, Borrow_token, Protocol, 'topup_positions', [position_hashes + [EMPTY_BYTES32] * (POSITION_BATCH_SIZE - 1), [0] * POSITION_BATCH_SIZE])
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.topup_position(position_hashes[0], Web3.toWei('0.1', 'ether')), gas=1000000)
+    assert Protocol.functions.position(position_hashes[0]).call()[12] == borrow_currency_current_value
+
+
+def test_reentrancy_guard_gas(w3, Protocol, transact_as_local_account, record_gas):
+    # an empty batch does nothing but take and release the lock
+    args = [[EMPTY_BYTES32] * POSITION_BATCH_SIZE, [0] * POSITION_BATCH_SIZE]
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.topup_positions(*args), gas=1000000)
+    gas_used = record_gas('topup_positions/empty_batch', tx_hash)
+    calldata = Web3.toBytes(hexstr=Protocol.encodeABI(fn_name='topup_positions', args=args))
+    intrinsic_gas = 21000 + sum(4 if byte == 0 else 68 for byte in calldata)
+    # the lock costs less per call than the fresh SSTORE of the per-position locks it replaces
+    assert gas_used - intrinsic_gas < 20000
@@ -0,0 +1,80 @@
+from web3 import (Web3,)
+
+
+def registered_fills(kernel_fill, kernel_creator_salt, nonces):
+    """
+    Returns `fill_kernel` arguments without a kernel creator signature, for fills
+    of the same lender kernel approved by the wrangler under the given nonces.
+    """
+    fills = [kernel_fill(kernel_creator_salt, nonce) for nonce in nonces]
+    return [fill[:8] + (b'', fill[9]) for fill in fills]
+
+
+def test_fill_registered_kernel_without_signature(w3, Protocol, Market, kernel_fill, kernel_hash_of, transact_as_local_account, random_salt):
+    fills = registered_fills(kernel_fill, '0x{0}'.format(random_salt), range(1, 4))
+    kernel_hash = kernel_hash_of(fills[0])
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash, True))
+    assert Protocol.functions.kernels_registered(w3.eth.lenderAccount.address, kernel_hash).call()
+    for fill in fills:
+        Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 3
+    assert Protocol.functions.kernels_filled(kernel_hash).call() == 3 * Web3.toWei('1', 'ether')
+
+
+def test_fill_unregistered_kernel_without_signature(w3, Protocol, Market, kernel_fill, kernel_hash_of, transact_as_local_account, random_salt, assert_tx_failed):
+    fill = registered_fills(kernel_fill, '0x{0}'.format(random_salt), [1])[0]
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount}))
+    # a registration by anyone but the kernel creator does not count
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.register_kernel(kernel_hash_of(fill), True))
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.last_position_index().call() == 0
+
+
+def test_register_kernel_is_logged_and_can_be_undone(w3, Protocol, Market, kernel_fill, kernel_hash_of, transact_as_local_account, random_salt, assert_tx_failed):
+    fill = registered_fills(kernel_fill, '0x{0}'.format(random_salt), [1])[0]
+    kernel_hash = kernel_hash_of(fill)
+    for is_registered in [True, False]:
+        tx_hash = transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash, is_registered))
+        logs = Protocol.events.KernelRegistered().processReceipt(w3.eth.getTransactionReceipt(tx_hash))
+        assert len(logs) == 1
+        assert logs[0].args._kernel_hash == kernel_hash
+        assert logs[0].args._kernel_creator == w3.eth.lenderAccount.address
+        assert logs[0].args._is_registered == is_registered
+        assert Protocol.functions.kernels_registered(w3.eth.lenderAccount.address, kernel_hash).call() == is_registered
+    # an unregistered kernel is no longer filled without a signature
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount}))
+
+
+def test_cancel_registered_kernel_without_signature(w3, Protocol, Market, kernel_fill, kernel_hash_of, cancel_kernel_args, transact_as_local_account, assert_local_tx_failed, random_salt):
+    fill = registered_fills(kernel_fill, '0x{0}'.format(random_salt), [1])[0]
+    kernel_hash = kernel_hash_of(fill)
+    cancel_args = cancel_kernel_args(fill, Web3.toWei('40', 'ether'))
+    assert cancel_args[6] == b''
+    # the kernel's registration stands in for its creator's signature
+    assert_local_tx_failed(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_args), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash).call() == 0
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash, True))
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.cancel_kernel(*cancel_args), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash).call() == 0
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernel(*cancel_args), gas=1000000)
+    assert Protocol.functions.kernels_cancelled(kernel_hash).call() == Web3.toWei('40', 'ether')
+
+
+def test_fill_registered_kernel_cancelled_by_minimum_salt(w3, Protocol, Market, kernel_fill, kernel_hash_of, transact_as_local_account, assert_tx_failed):
+    fill = registered_fills(kernel_fill, '0x{0:064x}'.format(1), [1])[0]
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash_of(fill), True))
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.cancel_kernels_up_to(2))
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*fill).transact({'from': w3.eth.defaultAccount}))
+
+
+def test_fill_registered_kernel_gas(w3, Protocol, Market, kernel_fill, kernel_hash_of, transact_as_local_account, random_salt, record_gas):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1)).transact({'from': w3.eth.defaultAccount})
+    tx_hash = Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 2)).transact({'from': w3.eth.defaultAccount})
+    signed_gas_used = w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    fills = registered_fills(kernel_fill, kernel_creator_salt, range(3, 5))
+    transact_as_local_account(w3.eth.lenderAccount, Protocol.functions.register_kernel(kernel_hash_of(fills[0]), True))
+    Protocol.functions.fill_kernel(*fills[0]).transact({'from': w3.eth.defaultAccount})
+    tx_hash = Protocol.functions.fill_kernel(*fills[1]).transact({'from': w3.eth.defaultAccount})
+    registered_gas_used = record_gas('fill_kernel/registered_kernel', tx_hash)
+    assert registered_gas_used < signed_gas_used
@@ -0,0 +1,85 @@
+from web3 import (Web3,)
+
+from conftest import (POSITION_STATUS_OPEN,)
+
+
+def approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account):
+    # the borrower pays rollover fees in LST
+    LST_token.functions.mint(w3.eth.borrowerAccount.address, Web3.toWei('10', 'ether')).transact({'from': w3.eth.defaultAccount})
+    transact_as_local_account(w3.eth.borrowerAccount, LST_token.functions.approve(Protocol.address, Web3.toWei('10', 'ether')))
+
+
+def test_rollover_position_extends_the_position_by_a_term(w3, Protocol, LST_token, Market, open_positions, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account)
+    position = Protocol.functions.position(position_hash).call()
+    created_at, expires_at, lend_currency_filled_value, lend_currency_owed_value = position[6], position[8], position[13], position[14]
+    term, interest = expires_at - created_at, lend_currency_owed_value - lend_currency_filled_value
+    for rollovers in range(1, 3):
+        transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.rollover_position(position_hash), gas=1000000)
+        rolled_over_position = Protocol.functions.position(position_hash).call()
+        assert rolled_over_position[6] == created_at
+        assert rolled_over_position[7] == expires_at + (rollovers - 1) * term
+        assert rolled_over_position[8] == expires_at + rollovers * term
+        assert rolled_over_position[14] == lend_currency_owed_value + rollovers * interest
+        assert rolled_over_position[15] == POSITION_STATUS_OPEN
+        assert rolled_over_position[:6] + rolled_over_position[9:14] + rolled_over_position[16:] == position[:6] + position[9:14] + position[16:]
+    # rollover fees are paid by the borrower to the wrangler
+    assert LST_token.functions.balanceOf(w3.eth.borrowerAccount.address).call() == Web3.toWei('8', 'ether')
+    assert LST_token.functions.balanceOf(w3.eth.wranglerAccount.address).call() == Web3.toWei('3', 'ether')
+
+
+def test_rollover_position_is_rejected(w3, Protocol, LST_token, Market, open_positions, expire_position, transact_as_local_account, assert_local_tx_failed, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account)
+    position = Protocol.functions.position(position_hash).call()
+    # only the borrower can rollover
+    assert_local_tx_failed(w3.eth.lenderAccount, Protocol.functions.rollover_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call() == position
+    # expired positions cannot be rolled over
+    expire_position(position_hash)
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.rollover_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call() == position
+
+
+def test_rollover_position_of_closed_position_is_rejected(w3, Protocol, LST_token, Market, open_positions, transact_as_local_account, assert_local_tx_failed, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account)
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(position_hash), gas=1000000)
+    position = Protocol.functions.position(position_hash).call()
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.rollover_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call() == position
+
+
+def test_rollover_position_past_the_packed_timestamp_is_rejected(w3, Protocol, LST_token, Market, kernel_fill, fill_kernel, transact_as_local_account, assert_local_tx_failed, random_salt):
+    # the position fits, but its next expiry does not fit 64 bits
+    fill_kernel(kernel_fill('0x{0}'.format(random_salt), 1, position_duration_in_seconds=2**63))
+    position_hash = Protocol.functions.position_index(0).call()
+    approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account)
+    position = Protocol.functions.position(position_hash).call()
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.rollover_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call() == position
+
+
+def test_rollover_position_of_zero_duration_position_is_rejected(w3, Protocol, LST_token, Market, kernel_fill, fill_kernel, transact_as_local_account, assert_local_tx_failed, random_salt):
+    fill_kernel(kernel_fill('0x{0}'.format(random_salt), 1, position_duration_in_seconds=0))
+    position_hash = Protocol.functions.position_index(0).call()
+    approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account)
+    position = Protocol.functions.position(position_hash).call()
+    assert position[8] == position[6]
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.rollover_position(position_hash), gas=1000000)
+    assert Protocol.functions.position(position_hash).call() == position
+
+
+def test_rollover_position_gas(w3, Protocol, LST_token, Market, kernel_fill, fill_kernel, open_positions, transact_as_local_account, random_salt, record_gas):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    rolled_over_hash, closed_hash = open_positions(kernel_creator_salt, [1, 2])
+    approve_rollover_fees(w3, Protocol, LST_token, transact_as_local_account)
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.rollover_position(rolled_over_hash), gas=1000000)
+    rollover_gas_used = record_gas('rollover_position/beside_open_position', tx_hash)
+    # a closure followed by a new fill extends the loan without a rollover
+    tx_hash = transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.close_position(closed_hash), gas=1000000)
+    close_and_fill_gas_used = w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    tx_hash = fill_kernel(kernel_fill(kernel_creator_salt, 3))
+    close_and_fill_gas_used += w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    assert rollover_gas_used < close_and_fill_gas_used
@@ -0,0 +1,101 @@
+from eth_abi import (encode_abi,)
+from web3 import (Web3,)
+
+from conftest import (
+    SIGNATURE_SCHEME_EIP712,
+    SIGNATURE_SCHEME_ETH_SIGN,
+    ZERO_ADDRESS,
+)
+
+
+def typed_data_hash(domain_separator, type_string, types, values):
+    struct_hash = Web3.sha3(encode_abi(['bytes32'] + types, [Web3.sha3(text=type_string)] + values))
+    return Web3.sha3(b'\x19\x01' + bytes(domain_separator) + bytes(struct_hash))
+
+
+def test_domain_separator(w3, Protocol):
+    expected_domain_separator = Web3.sha3(encode_abi(
+        ['bytes32', 'bytes32', 'bytes32', 'address'],
+        [
+            Web3.sha3(text='EIP712Domain(string name,string version,address verifyingContract)'),
+            Web3.sha3(text='Lendroid Protocol'),
+            Web3.sha3(text='1'),
+            Protocol.address
+        ]
+    ))
+    assert Protocol.functions.domain_separator().call() == expected_domain_separator
+
+
+def test_kernel_hash_is_eip712_typed_data_hash(w3, Protocol, Lend_token, Borrow_token, random_salt):
+    addresses = [w3.eth.lenderAccount.address, ZERO_ADDRESS, w3.eth.relayerAccount.address, w3.eth.wranglerAccount.address, Borrow_token.address, Lend_token.address]
+    values = [Web3.toWei('40', 'ether')] + [Web3.toWei('1', 'ether')] * 4
+    kernel_creator_salt = Web3.toBytes(hexstr=random_salt)
+    kernel_hash = Protocol.functions.kernel_hash(addresses, values, 1600000000, kernel_creator_salt, Web3.toWei('0.000001', 'ether'), 86400).call()
+    assert kernel_hash == typed_data_hash(
+        Protocol.functions.domain_separator().call(),
+        'Kernel(address lender,address borrower,address relayer,address wrangler,address collateralToken,address loanToken,'
+        'uint256 loanAmountOffered,uint256 relayerFeeLST,uint256 monitoringFeeLST,uint256 rolloverFeeLST,uint256 closureFeeLST,'
+        'bytes32 creatorSalt,uint256 offerExpiryTimestamp,uint256 loanInterestRatePerDay,uint256 loanDuration)',
+        ['address'] * 6 + ['uint256'] * 5 + ['bytes32'] + ['uint256'] * 3,
+        addresses + values + [kernel_creator_salt, 1600000000, Web3.toWei('0.000001', 'ether'), 86400]
+    )
+
+
+def test_position_hash_is_eip712_typed_data_hash(w3, Protocol, Lend_token, Borrow_token):
+    addresses = [w3.eth.lenderAccount.address, w3.eth.lenderAccount.address, w3.eth.borrowerAccount.address, w3.eth.relayerAccount.address, w3.eth.wranglerAccount.address, Borrow_token.address, Lend_token.address]
+    values = [Web3.toWei('0.1', 'ether'), Web3.toWei('40', 'ether')] + [Web3.toWei('1', 'ether')] * 5
+    position_hash = Protocol.functions.position_hash(addresses, values, Web3.toWei('1.1', 'ether'), 7).call()
+    assert position_hash == typed_data_hash(
+        Protocol.functions.domain_separator().call(),
+        'Position(address collateralToken,address loanToken,uint256 collateralAmount,uint256 loanAmountFilled,uint256 loanAmountOwed,'
+        'address kernelCreator,address lender,address borrower,address relayer,address wrangler,'
+        'uint256 relayerFeeLST,uint256 monitoringFeeLST,uint256 rolloverFeeLST,uint256 closureFeeLST,uint256 nonce)',
+        ['address'] * 2 + ['uint256'] * 3 + ['address'] * 5 + ['uint256'] * 5,
+        addresses[5:] + [values[0], values[6], Web3.toWei('1.1', 'ether')] + addresses[:5] + values[2:6] + [7]
+    )
+
+
+def test_is_signer_checks_the_selected_scheme(w3, Protocol, sign_hash):
+    _hash = Web3.sha3(text='signed hash')
+    signer = w3.eth.lenderAccount
+    # legacy signatures are accepted raw or eth_sign prefixed
+    assert Protocol.functions.is_signer(signer.address, _hash, sign_hash(_hash, signer)).call()
+    assert Protocol.functions.is_signer(signer.address, _hash, w3.eth.account.signHash(_hash, private_key=signer.privateKey).signature).call()
+    # selected schemes are accepted only in their own form
+    eip712_signature = sign_hash(_hash, signer, SIGNATURE_SCHEME_EIP712)
+    eth_sign_signature = sign_hash(_hash, signer, SIGNATURE_SCHEME_ETH_SIGN)
+    assert Protocol.functions.is_signer(signer.address, _hash, eip712_signature).call()
+    assert Protocol.functions.is_signer(signer.address, _hash, eth_sign_signature).call()
+    assert not Protocol.functions.is_signer(signer.address, _hash, eip712_signature[:65] + bytes([SIGNATURE_SCHEME_ETH_SIGN])).call()
+    assert not Protocol.functions.is_signer(signer.address, _hash, eth_sign_signature[:65] + bytes([SIGNATURE_SCHEME_EIP712])).call()
+    # unknown schemes, short signatures and trailing bytes are rejected
+    assert not Protocol.functions.is_signer(signer.address, _hash, eip712_signature[:65] + bytes([3])).call()
+    assert not Protocol.functions.is_signer(signer.address, _hash, eip712_signature[:64]).call()
+    assert not Protocol.functions.is_signer(signer.address, _hash, eip712_signature + bytes(32)).call()
+    assert not Protocol.functions.is_signer(w3.eth.borrowerAccount.address, _hash, eip712_signature).call()
+
+
+def test_fill_kernel_with_eip712_signatures(w3, Protocol, Market, kernel_fill, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1, SIGNATURE_SCHEME_EIP712)).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.last_position_index().call() == 1
+    # a signature selecting a different scheme than it was made for is rejected
+    fill = kernel_fill(kernel_creator_salt, 2, SIGNATURE_SCHEME_EIP712)
+    fill = fill[:9] + (fill[9][:65] + bytes([SIGNATURE_SCHEME_ETH_SIGN]),)
+    assert Protocol.functions.fill_kernels(
+        [fill[0]] + [[ZERO_ADDRESS] * 6] * 4, [fill[1]] + [[0] * 7] * 4, [fill[2]] + [0] * 4, [fill[3]] + [0] * 4,
+        [fill[4]] + [False] * 4, [fill[5]] + [[0, 0]] * 4, [fill[6]] + [0] * 4, [fill[7]] + ['0x{0}'.format('00' * 32)] * 4,
+        fill[8], fill[9]
+    ).call() == [False] * 5
+
+
+def test_fill_kernel_gas_by_signature_scheme(w3, Protocol, Market, kernel_fill, random_salt, record_gas):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1)).transact({'from': w3.eth.defaultAccount})
+    gas_used = {}
+    for nonce, (scenario, signature_scheme) in enumerate([('legacy', None), ('eth_sign', SIGNATURE_SCHEME_ETH_SIGN), ('eip712', SIGNATURE_SCHEME_EIP712)], 2):
+        tx_hash = Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, nonce, signature_scheme)).transact({'from': w3.eth.defaultAccount})
+        gas_used[signature_scheme] = record_gas('fill_kernel/{0}_signatures'.format(scenario), tx_hash)
+    # legacy signatures pay for a failed recovery of the raw hash, per signature
+    assert gas_used[SIGNATURE_SCHEME_ETH_SIGN] < gas_used[None] - 2 * 3000
+    assert gas_used[SIGNATURE_SCHEME_EIP712] < gas_used[None] - 2 * 3000
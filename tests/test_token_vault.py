@@ -0,0 +1,112 @@
+from web3 import (Web3,)
+
+
+def deposit(w3, Protocol, token, account, value, transact_as_local_account):
+    transact_as_local_account(account, Protocol.functions.deposit(token.address, value), gas=200000)
+
+
+def join_vault(w3, Protocol, accounts, transact_as_local_account):
+    for account in accounts:
+        transact_as_local_account(account, Protocol.functions.set_vault_status(True), gas=200000)
+
+
+def test_deposit_and_withdraw(w3, Protocol, Lend_token, Market, transact_as_local_account):
+    lender = w3.eth.lenderAccount
+    deposit(w3, Protocol, Lend_token, lender, Web3.toWei('10', 'ether'), transact_as_local_account)
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('10', 'ether')
+    assert Lend_token.functions.balanceOf(Protocol.address).call() == Web3.toWei('10', 'ether')
+    transact_as_local_account(lender, Protocol.functions.withdraw(Lend_token.address, Web3.toWei('4', 'ether')), gas=200000)
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('6', 'ether')
+    assert Lend_token.functions.balanceOf(lender.address).call() == Web3.toWei('94', 'ether')
+    # withdrawals cannot exceed the deposited balance
+    transact_as_local_account(lender, Protocol.functions.withdraw(Lend_token.address, Web3.toWei('7', 'ether')), gas=200000)
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('6', 'ether')
+    assert Lend_token.functions.balanceOf(lender.address).call() == Web3.toWei('94', 'ether')
+
+
+def test_transfer_token_is_internal(w3, Protocol, Lend_token, Market, assert_tx_failed):
+    assert_tx_failed(lambda: Protocol.functions.transfer_token(
+        Lend_token.address, w3.eth.lenderAccount.address, w3.eth.maliciousUserAccount, Web3.toWei('1', 'ether')
+    ).transact({'from': w3.eth.maliciousUserAccount}))
+
+
+def test_fill_and_close_from_deposits(w3, Protocol, LST_token, Lend_token, Borrow_token, Market, kernel_fill, transact_as_local_account, random_salt):
+    lender, borrower = w3.eth.lenderAccount, w3.eth.borrowerAccount
+    join_vault(w3, Protocol, [lender, borrower, w3.eth.wranglerAccount, w3.eth.relayerAccount], transact_as_local_account)
+    deposit(w3, Protocol, Lend_token, lender, Web3.toWei('10', 'ether'), transact_as_local_account)
+    deposit(w3, Protocol, LST_token, lender, Web3.toWei('10', 'ether'), transact_as_local_account)
+    deposit(w3, Protocol, Borrow_token, borrower, Web3.toWei('1', 'ether'), transact_as_local_account)
+    Protocol.functions.fill_kernel(*kernel_fill('0x{0}'.format(random_salt), 1)).transact({'from': w3.eth.defaultAccount})
+    # the fill is paid with ledger moves only
+    assert Protocol.functions.token_balances(Borrow_token.address, borrower.address).call() == Web3.toWei('0.9', 'ether')
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('9', 'ether')
+    assert Protocol.functions.token_balances(Lend_token.address, borrower.address).call() == Web3.toWei('1', 'ether')
+    assert Protocol.functions.token_balances(LST_token.address, lender.address).call() == Web3.toWei('8', 'ether')
+    assert Protocol.functions.token_balances(LST_token.address, w3.eth.wranglerAccount.address).call() == Web3.toWei('1', 'ether')
+    assert Protocol.functions.token_balances(LST_token.address, w3.eth.relayerAccount.address).call() == Web3.toWei('1', 'ether')
+    assert Lend_token.functions.balanceOf(Protocol.address).call() == Web3.toWei('10', 'ether')
+    assert Borrow_token.functions.balanceOf(Protocol.address).call() == Web3.toWei('1', 'ether')
+    # accrued fees are withdrawn in bulk
+    transact_as_local_account(w3.eth.wranglerAccount, Protocol.functions.withdraw(LST_token.address, Web3.toWei('1', 'ether')), gas=200000)
+    assert LST_token.functions.balanceOf(w3.eth.wranglerAccount.address).call() == Web3.toWei('1', 'ether')
+    # the loan is repaid from the deposited balance, and the collateral is transferred back
+    position_hash = Protocol.functions.position_index(0).call()
+    lend_currency_owed_value = Protocol.functions.position(position_hash).call()[14]
+    deposit(w3, Protocol, Lend_token, borrower, lend_currency_owed_value, transact_as_local_account)
+    transact_as_local_account(borrower, Protocol.functions.close_position(position_hash), gas=1000000)
+    assert Protocol.functions.token_balances(Lend_token.address, borrower.address).call() == Web3.toWei('1', 'ether')
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('9', 'ether') + lend_currency_owed_value
+    assert Borrow_token.functions.balanceOf(borrower.address).call() == Web3.toWei('99.1', 'ether')
+
+
+def test_fill_with_insufficient_deposits_transfers_tokens(w3, Protocol, Lend_token, Market, kernel_fill, transact_as_local_account, random_salt):
+    lender, borrower = w3.eth.lenderAccount, w3.eth.borrowerAccount
+    deposit(w3, Protocol, Lend_token, lender, Web3.toWei('0.5', 'ether'), transact_as_local_account)
+    Protocol.functions.fill_kernel(*kernel_fill('0x{0}'.format(random_salt), 1)).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('0.5', 'ether')
+    assert Lend_token.functions.balanceOf(borrower.address).call() == Web3.toWei('101', 'ether')
+
+
+def test_payments_to_accounts_outside_of_the_vault_are_transferred(w3, Protocol, LST_token, Lend_token, Market, kernel_fill, transact_as_local_account, random_salt):
+    lender, borrower = w3.eth.lenderAccount, w3.eth.borrowerAccount
+    deposit(w3, Protocol, Lend_token, lender, Web3.toWei('10', 'ether'), transact_as_local_account)
+    deposit(w3, Protocol, LST_token, lender, Web3.toWei('10', 'ether'), transact_as_local_account)
+    join_vault(w3, Protocol, [w3.eth.wranglerAccount], transact_as_local_account)
+    Protocol.functions.fill_kernel(*kernel_fill('0x{0}'.format(random_salt), 1)).transact({'from': w3.eth.defaultAccount})
+    # the payments are debited from the lender's deposits, and only credited to the wrangler's
+    assert Protocol.functions.token_balances(Lend_token.address, lender.address).call() == Web3.toWei('9', 'ether')
+    assert Protocol.functions.token_balances(Lend_token.address, borrower.address).call() == 0
+    assert Lend_token.functions.balanceOf(borrower.address).call() == Web3.toWei('101', 'ether')
+    assert Protocol.functions.token_balances(LST_token.address, w3.eth.wranglerAccount.address).call() == Web3.toWei('1', 'ether')
+    assert Protocol.functions.token_balances(LST_token.address, w3.eth.relayerAccount.address).call() == 0
+    assert LST_token.functions.balanceOf(w3.eth.relayerAccount.address).call() == Web3.toWei('1', 'ether')
+    assert Protocol.functions.token_deposits(Lend_token.address).call() == Web3.toWei('9', 'ether')
+    assert Protocol.functions.token_deposits(LST_token.address).call() == Web3.toWei('9', 'ether')
+
+
+def test_escape_hatch_token_leaves_the_deposits(w3, Protocol, Lend_token, Market, transact_as_local_account):
+    lender = w3.eth.lenderAccount
+    deposit(w3, Protocol, Lend_token, lender, Web3.toWei('10', 'ether'), transact_as_local_account)
+    Lend_token.functions.mint(Protocol.address, Web3.toWei('1', 'ether')).transact({'from': w3.eth.defaultAccount})
+    owner_balance = Lend_token.functions.balanceOf(w3.eth.defaultAccount).call()
+    Protocol.functions.escape_hatch_token(Lend_token.address).transact({'from': w3.eth.defaultAccount})
+    assert Lend_token.functions.balanceOf(w3.eth.defaultAccount).call() == owner_balance + Web3.toWei('1', 'ether')
+    assert Lend_token.functions.balanceOf(Protocol.address).call() == Web3.toWei('10', 'ether')
+    # the deposits can still be withdrawn in full
+    transact_as_local_account(lender, Protocol.functions.withdraw(Lend_token.address, Web3.toWei('10', 'ether')), gas=200000)
+    assert Lend_token.functions.balanceOf(lender.address).call() == Web3.toWei('100', 'ether')
+
+
+def test_fill_kernel_gas_from_deposits(w3, Protocol, LST_token, Lend_token, Borrow_token, Market, kernel_fill, transact_as_local_account, random_salt, record_gas):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 1)).transact({'from': w3.eth.defaultAccount})
+    tx_hash = Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 2)).transact({'from': w3.eth.defaultAccount})
+    transfer_gas_used = w3.eth.getTransactionReceipt(tx_hash)['gasUsed']
+    join_vault(w3, Protocol, [w3.eth.borrowerAccount, w3.eth.wranglerAccount, w3.eth.relayerAccount], transact_as_local_account)
+    deposit(w3, Protocol, Lend_token, w3.eth.lenderAccount, Web3.toWei('10', 'ether'), transact_as_local_account)
+    deposit(w3, Protocol, LST_token, w3.eth.lenderAccount, Web3.toWei('10', 'ether'), transact_as_local_account)
+    deposit(w3, Protocol, Borrow_token, w3.eth.borrowerAccount, Web3.toWei('1', 'ether'), transact_as_local_account)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 3)).transact({'from': w3.eth.defaultAccount})
+    tx_hash = Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 4)).transact({'from': w3.eth.defaultAccount})
+    deposit_gas_used = record_gas('fill_kernel/from_deposits', tx_hash)
+    assert deposit_gas_used < transfer_gas_used
@@ -0,0 +1,24 @@
+from web3 import (Web3,)
+
+
+def test_topup_position_should_not_be_callable_by_lender_or_wrangler(w3, Protocol, Market, open_positions, assert_local_tx_failed, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    for account in [w3.eth.lenderAccount, w3.eth.wranglerAccount]:
+        assert_local_tx_failed(account, Protocol.functions.topup_position(position_hash, Web3.toWei('1', 'ether')), gas=1000000)
+        assert Protocol.functions.position(position_hash).call()[12] == Web3.toWei('0.1', 'ether')
+
+
+def test_topup_position_should_increment_borrow_currency_current_value(w3, Protocol, Borrow_token, Market, open_positions, transact_as_local_account, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    position = Protocol.functions.position(position_hash).call()
+    assert position[11] == position[12]
+    transact_as_local_account(w3.eth.borrowerAccount, Protocol.functions.topup_position(position_hash, Web3.toWei('1', 'ether')), gas=1000000)
+    assert Protocol.functions.position(position_hash).call()[12] == position[11] + Web3.toWei('1', 'ether')
+    assert Borrow_token.functions.balanceOf(Protocol.address).call() == Web3.toWei('1.1', 'ether')
+
+
+def test_topup_position_should_not_be_callable_by_borrower_after_position_has_expired(w3, Protocol, Market, open_positions, expire_position, assert_local_tx_failed, random_salt):
+    position_hash, = open_positions('0x{0}'.format(random_salt), [1])
+    expire_position(position_hash)
+    assert_local_tx_failed(w3.eth.borrowerAccount, Protocol.functions.topup_position(position_hash, Web3.toWei('1', 'ether')), gas=1000000)
+    assert Protocol.functions.position(position_hash).call()[12] == Web3.toWei('0.1', 'ether')
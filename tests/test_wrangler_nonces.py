@@ -0,0 +1,28 @@
+def test_fill_kernel_accepts_wrangler_nonces_in_any_order(w3, Protocol, Market, kernel_fill, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    wrangler = w3.eth.wranglerAccount.address
+    lender = w3.eth.lenderAccount.address
+    # approvals signed concurrently are submitted out of order
+    for nonce in [7, 2, 300, 0]:
+        assert not Protocol.functions.is_wrangler_nonce_used(wrangler, lender, nonce).call()
+        Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, nonce)).transact({'from': w3.eth.defaultAccount})
+        assert Protocol.functions.is_wrangler_nonce_used(wrangler, lender, nonce).call()
+    assert Protocol.functions.last_position_index().call() == 4
+    # nonces skipped so far remain usable
+    assert not Protocol.functions.is_wrangler_nonce_used(wrangler, lender, 1).call()
+    assert Protocol.functions.wrangler_nonce_bitmaps(wrangler, lender, 0).call() == 0b10000101
+    assert Protocol.functions.wrangler_nonce_bitmaps(wrangler, lender, 1).call() == 1 << (300 - 256)
+
+
+def test_fill_kernel_rejects_a_used_wrangler_nonce(w3, Protocol, Market, kernel_fill, random_salt, assert_tx_failed):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 5)).transact({'from': w3.eth.defaultAccount})
+    assert_tx_failed(lambda: Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 5)).transact({'from': w3.eth.defaultAccount}))
+    assert Protocol.functions.last_position_index().call() == 1
+
+
+def test_wrangler_nonces_are_per_kernel_creator(w3, Protocol, Market, kernel_fill, random_salt):
+    kernel_creator_salt = '0x{0}'.format(random_salt)
+    Protocol.functions.fill_kernel(*kernel_fill(kernel_creator_salt, 5)).transact({'from': w3.eth.defaultAccount})
+    assert Protocol.functions.is_wrangler_nonce_used(w3.eth.wranglerAccount.address, w3.eth.lenderAccount.address, 5).call()
+    assert not Protocol.functions.is_wrangler_nonce_used(w3.eth.wranglerAccount.address, w3.eth.borrowerAccount.address, 5).call()